@@ -0,0 +1,114 @@
+"""Import throughput: /import (row-by-row py2neo merges) vs /bulk_import (LOAD CSV).
+
+By default the app runs in-process against NEO4J_URI; --standin swaps in the
+in-memory graph (only /import is meaningful there, LOAD CSV runs inside Neo4j).
+/bulk_import reads from the Neo4j import directory, so pass --neo4j-import-dir
+to have the generated CSVs copied there first.
+
+    python -m benchmarks.bench_import --data-dir benchmarks/data/x1 --neo4j-import-dir /var/lib/neo4j/import
+"""
+import argparse
+import asyncio
+import csv
+import os
+import shutil
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import compare_to_baseline, load_app, run_metadata, write_report
+from benchmarks.standin import StandInGraph
+
+CSV_FILES = ("movies.csv", "actors.csv", "directors.csv")
+
+
+def count_rows(data_dir: Path):
+    counts = {"movies": 0, "actors": 0, "directors": 0, "relationships": 0}
+    for name in ("actors", "directors"):
+        with open(data_dir / f"{name}.csv", encoding="utf-8-sig") as f:
+            counts[name] = sum(1 for _ in csv.DictReader(f))
+    with open(data_dir / "movies.csv", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            cast = len([a for a in row["演员"].split("、") if a.strip()])
+            directors = len([d for d in row["导演"].split("、") if d.strip()])
+            counts["movies"] += 1
+            # ACTED_IN + DIRECTED + COOPERATED_WITH
+            counts["relationships"] += cast + directors + cast * directors
+    return counts
+
+
+async def time_endpoint(client, path, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await client.post(path)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} failed with {response.status_code}: {response.text[:200]}")
+        timings.append(elapsed)
+    return timings
+
+
+async def run(args):
+    data_dir = args.data_dir.resolve()
+    if args.neo4j_import_dir:
+        for filename in CSV_FILES:
+            shutil.copy(data_dir / filename, Path(args.neo4j_import_dir) / filename)
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=None)
+    else:
+        os.environ["DATA_DIR"] = str(data_dir)
+        main = load_app(StandInGraph() if args.standin else None)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                   base_url="http://bench", timeout=None)
+
+    counts = count_rows(data_dir)
+    total_rows = counts["movies"] + counts["actors"] + counts["directors"]
+    results = {}
+    async with client:
+        for endpoint in args.endpoints:
+            if args.standin and endpoint == "bulk_import":
+                print("skipping /bulk_import: LOAD CSV cannot run against the stand-in", file=sys.stderr)
+                continue
+            timings = await time_endpoint(client, f"/{endpoint}", args.repeat)
+            median = statistics.median(timings)
+            results[endpoint] = {
+                "runs_s": [round(t, 3) for t in timings],
+                "median_s": round(median, 3),
+                "nodes_per_s": round(total_rows / median, 1),
+                "relationships_per_s": round(counts["relationships"] / median, 1),
+            }
+    return {"meta": run_metadata(args), "dataset": counts, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", type=Path, required=True, help="directory produced by generate_data")
+    parser.add_argument("--endpoints", nargs="+", choices=("import", "bulk_import"),
+                        default=["import", "bulk_import"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app "
+                                           "(start it with DATA_DIR pointing at --data-dir)")
+    parser.add_argument("--standin", action="store_true", help="use the in-memory stand-in graph")
+    parser.add_argument("--neo4j-import-dir", type=Path, help="copy CSVs here for /bulk_import")
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path, help="previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression (fraction)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    write_report(report, args.output)
+    if args.baseline:
+        regressions = compare_to_baseline(report["results"], args.baseline, "nodes_per_s",
+                                          args.tolerance, higher_is_better=True)
+        if regressions:
+            print("Import throughput regressed:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
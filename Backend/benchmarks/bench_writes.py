@@ -0,0 +1,156 @@
+"""Write-path latency: create, link and delete through the API, then the orphan sweep.
+
+Each round creates an actor, a director and a movie, links both people to the
+movie, deletes a movie from the dataset (dropping collaborations that no
+longer share a movie and queueing its people for the sweep), deletes the new
+movie and the new actor, and leaves the new director orphaned. After the
+rounds the sweep runs until it removes nothing, and the /stats counters, which
+every write updates incrementally, are compared with a full rebuild. On the
+stand-in it also checks that a read arriving after a delete never gets the
+result of a slow read that started before it.
+
+The run deletes --rounds movies from the catalog, so point it at the stand-in
+or at a scratch database loaded from --data-dir (NEO4J_URI, after /bulk_import).
+
+    python -m benchmarks.bench_writes --standin benchmarks/data/x1 --rounds 200
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import quote
+
+import httpx
+
+from benchmarks.common import compare_to_baseline, latency_summary, load_app, run_metadata, write_report
+from benchmarks.load_test import load_names
+from benchmarks.standin import StandInGraph
+
+STEPS = ("create_actor", "create_director", "create_movie", "actor_in_movie", "director_in_movie",
+         "delete_catalog_movie", "delete_movie", "delete_actor")
+
+
+def round_requests(index, victim):
+    actor, director, movie = f"bench-actor-{index}", f"bench-director-{index}", f"bench-movie-{index}"
+    return [
+        ("create_actor", "POST", "/actors", {"name": actor}),
+        ("create_director", "POST", "/directors", {"name": director}),
+        ("create_movie", "POST", "/movies", {"title": movie, "genres": ["剧情"], "release_date": "2024-01-01"}),
+        ("actor_in_movie", "POST", "/actor_in_movie", {"actor_name": actor, "movie_title": movie}),
+        ("director_in_movie", "POST", "/director_in_movie", {"director_name": director, "movie_title": movie}),
+        ("delete_catalog_movie", "DELETE", f"/movies/{quote(victim)}", None),
+        ("delete_movie", "DELETE", f"/movies/{quote(movie)}", None),
+        ("delete_actor", "DELETE", f"/actors/{quote(actor)}", None),
+    ]
+
+
+async def catalog_stats(client):
+    response = await client.get("/stats")
+    if response.status_code != 200:
+        raise RuntimeError(f"/stats failed with {response.status_code}: {response.text[:200]}")
+    stats = response.json()
+    stats.pop("computed_at", None)
+    stats.pop("updated_at", None)
+    return stats
+
+
+async def read_after_delete(main, client, title):
+    # 先发起一个（被放慢的）读，读还没结束时删除电影，删除返回后再读：
+    # 第二个读不能搭上第一个读的 Neo4j 调用而拿到已删除的电影
+    path = f"/movies/{quote(title)}/cast"
+    main.graph.delays["movie_cast"] = 0.2
+    try:
+        before = asyncio.ensure_future(client.get(path))
+        while not main.singleflight.calls and not before.done():  # 等第一个读真正发到图上
+            await asyncio.sleep(0.005)
+        deleted = await client.delete(f"/movies/{quote(title)}")
+        after = await client.get(path)
+        await before
+    finally:
+        main.graph.delays.clear()
+    return deleted.status_code == 200 and after.status_code == 404
+
+
+async def run(args):
+    main = load_app(StandInGraph().load_csvs(args.standin) if args.standin else None)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=None)
+    movies = load_names(args.data_dir or args.standin)["movies"]
+    if args.rounds >= len(movies):
+        raise SystemExit(f"--rounds {args.rounds} must be below the {len(movies)} movies in the dataset")
+    victims = random.Random(args.seed).sample(movies, args.rounds + 1)
+    read_after_delete_victim = victims.pop()
+
+    samples, errors = defaultdict(list), defaultdict(int)
+    async with client:
+        await catalog_stats(client)  # 先建好统计，之后的写入都走增量更新
+        start = time.perf_counter()
+        for index, victim in enumerate(victims):
+            for label, method, path, body in round_requests(index, victim):
+                request_start = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                samples[label].append(time.perf_counter() - request_start)
+                if response.status_code >= 400:
+                    errors[label] += 1
+        elapsed = time.perf_counter() - start
+
+        sweep_timings, swept = [], defaultdict(int)
+        while True:
+            sweep_start = time.perf_counter()
+            removed = main.sweep_once()
+            sweep_timings.append(time.perf_counter() - sweep_start)
+            for kind, count in removed.items():
+                swept[kind] += count
+            if not any(removed.values()):
+                break
+
+        consistent_reads = await read_after_delete(main, client, read_after_delete_victim) if args.standin else None
+
+        incremental = await catalog_stats(client)
+        main.rebuild_stats()
+        rebuilt = await catalog_stats(client)
+
+    results = {label: latency_summary(samples[label], errors[label], elapsed) for label in STEPS}
+    results["overall"] = latency_summary([s for label in STEPS for s in samples[label]],
+                                         sum(errors.values()), elapsed)
+    results["sweep"] = {**latency_summary(sweep_timings, 0, sum(sweep_timings)), "removed": dict(swept)}
+    return {"meta": run_metadata(args), "stats_consistent": incremental == rebuilt,
+            "read_after_delete_consistent": consistent_reads, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--standin", type=Path, help="run against this generated dataset in the in-memory stand-in "
+                                                     "(default: NEO4J_URI)")
+    parser.add_argument("--data-dir", type=Path, help="dataset loaded into Neo4j (default: --standin)")
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path, help="previous report to compare p99 against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p99 regression (fraction)")
+    args = parser.parse_args()
+    if not (args.standin or args.data_dir):
+        parser.error("--data-dir is required without --standin")
+
+    report = asyncio.run(run(args))
+    write_report(report, args.output)
+    failed = False
+    if not report["stats_consistent"]:
+        print("Incrementally updated /stats differ from a full rebuild", file=sys.stderr)
+        failed = True
+    if report["read_after_delete_consistent"] is False:
+        print("A read issued after DELETE /movies returned the deleted movie", file=sys.stderr)
+        failed = True
+    if args.baseline:
+        regressions = compare_to_baseline(report["results"], args.baseline, "p99_ms", args.tolerance)
+        if regressions:
+            print("Latency regressed:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
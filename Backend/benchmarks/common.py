@@ -0,0 +1,81 @@
+import json
+import math
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+
+def load_app(standin=None):
+    """Import main.py and attach either an in-process StandInGraph or NEO4J_URI.
+
+    httpx.ASGITransport does not run the lifespan hook, so the graph is
+    attached here instead of by the app's own startup.
+    """
+    import main
+    if standin is not None:
+        from benchmarks.standin import StandInMatcher
+        main.set_graph(standin, StandInMatcher(standin))
+    else:
+        main.connect_neo4j()
+    return main
+
+
+def percentile(sorted_values, pct):
+    # nearest-rank 百分位，输入需已排序
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return round(sorted_values[rank - 1], 3)
+
+
+def latency_summary(latencies_s, errors, elapsed_s):
+    values = sorted(v * 1000 for v in latencies_s)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed_s, 2) if elapsed_s else None,
+        "mean_ms": round(sum(values) / len(values), 3) if values else None,
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": round(values[-1], 3) if values else None,
+    }
+
+
+def run_metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+    }
+
+
+def write_report(report, output):
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        Path(output).write_text(text, encoding="utf-8")
+    print(text)
+
+
+def compare_to_baseline(results, baseline_path, metric, tolerance, higher_is_better=False):
+    """Return the names whose metric regressed by more than tolerance (fraction)."""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))["results"]
+    regressions = []
+    for name, current in results.items():
+        before, after = baseline.get(name, {}).get(metric), current.get(metric)
+        if not before or after is None:
+            continue
+        change = (before - after) / before if higher_is_better else (after - before) / before
+        if change > tolerance:
+            regressions.append(f"{name}: {metric} {before} -> {after} ({change:+.0%})")
+    return regressions
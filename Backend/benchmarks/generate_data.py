@@ -0,0 +1,138 @@
+"""Generate synthetic movies/actors/directors CSVs in the Data/ format.
+
+The distributions (cast size, directors per movie, genres, release years and
+how often each actor/director appears) are sampled from the real Data/*.csv,
+so a 10x catalog looks like ten copies of ours rather than uniform noise.
+
+    python -m benchmarks.generate_data --scale 1 10 100 --output-dir benchmarks/data
+"""
+import argparse
+import bisect
+import csv
+import itertools
+import random
+from collections import Counter
+from pathlib import Path
+
+SOURCE_DIR = Path(__file__).resolve().parent.parent.parent / "Data"
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
+GIVEN_CHARS = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰萍红建文辉力宇峰鑫志海波晨雪琳宁浩然欣怡子轩梓涵一诺雨泽思远博文嘉怡天佑俊杰"
+TITLE_WORDS = "长城 夜色 归途 风云 江湖 少年 追光 迷城 破晓 无间 海上 心花 唐人 战狼 流浪 星河 寻梦 南方 北国 山海 烈火 青春 时光 故乡 秘境 狂飙 雨季 逆行 孤岛 白昼".split()
+
+
+def read_source(source_dir: Path):
+    # 从真实数据中提取各项经验分布
+    with open(source_dir / "movies.csv", encoding="utf-8-sig") as f:
+        movies = list(csv.DictReader(f))
+    with open(source_dir / "actors.csv", encoding="utf-8-sig") as f:
+        actor_count = sum(1 for _ in csv.DictReader(f))
+    with open(source_dir / "directors.csv", encoding="utf-8-sig") as f:
+        director_count = sum(1 for _ in csv.DictReader(f))
+
+    def split_names(value):
+        return [name.strip() for name in (value or "").split("、") if name.strip()]
+
+    actor_appearances = Counter(a for row in movies for a in split_names(row["演员"]))
+    director_appearances = Counter(d for row in movies for d in split_names(row["导演"]))
+    return {
+        "movies": len(movies),
+        "actors": actor_count,
+        "directors": director_count,
+        "cast_sizes": [len(split_names(row["演员"])) for row in movies],
+        "director_counts": [max(1, len(split_names(row["导演"]))) for row in movies],
+        "genres": [row["类型"] for row in movies if row["类型"]],
+        "years": [row["上映时间"][:4] for row in movies if row["上映时间"][:4].isdigit()],
+        "actor_weights": list(actor_appearances.values()),
+        "director_weights": list(director_appearances.values()),
+    }
+
+
+def unique_names(rng: random.Random, count: int):
+    # 随机中文姓名，重名时追加序号保证唯一（姓名是图中的 MERGE 键）
+    seen = set()
+    names = []
+    while len(names) < count:
+        name = rng.choice(SURNAMES) + "".join(rng.choices(GIVEN_CHARS, k=rng.choice((1, 2))))
+        if name in seen:
+            name = f"{name}{len(names)}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+class WeightedPool:
+    """Draws distinct names per movie with popularity taken from the real data."""
+
+    def __init__(self, rng: random.Random, names, weights):
+        self.rng = rng
+        self.names = names
+        # 给每个人随机分配一个真实数据中的出场次数作为权重
+        self.cum_weights = list(itertools.accumulate(rng.choice(weights) for _ in names))
+
+    def sample(self, k: int):
+        k = min(k, len(self.names))
+        picked = set()
+        total = self.cum_weights[-1]
+        while len(picked) < k:
+            idx = bisect.bisect_right(self.cum_weights, self.rng.random() * total)
+            picked.add(self.names[min(idx, len(self.names) - 1)])
+        return list(picked)
+
+
+def generate(output_dir: Path, scale: float, stats: dict, seed: int = 42):
+    rng = random.Random(seed)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    n_movies = max(1, round(stats["movies"] * scale))
+    n_actors = max(1, round(stats["actors"] * scale))
+    n_directors = max(1, round(stats["directors"] * scale))
+
+    actor_names = unique_names(rng, n_actors)
+    director_names = unique_names(rng, n_directors)
+    actors = WeightedPool(rng, actor_names, stats["actor_weights"])
+    directors = WeightedPool(rng, director_names, stats["director_weights"])
+
+    for filename, names in (("actors.csv", actor_names), ("directors.csv", director_names)):
+        with open(output_dir / filename, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["姓名", "行号"])
+            for idx, name in enumerate(names, start=1):
+                writer.writerow([name, idx])
+
+    with open(output_dir / "movies.csv", "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["中文名", "英文名", "类型", "上映时间", "演员", "导演", "行号"])
+        for idx in range(1, n_movies + 1):
+            title = "".join(rng.sample(TITLE_WORDS, 2)) + str(idx)
+            release_date = f"{rng.choice(stats['years'])}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            writer.writerow([
+                title,
+                f"Synthetic Movie {idx}",
+                rng.choice(stats["genres"]),
+                release_date,
+                "、".join(actors.sample(rng.choice(stats["cast_sizes"]))),
+                "、".join(directors.sample(rng.choice(stats["director_counts"]))),
+                idx,
+            ])
+
+    return {"movies": n_movies, "actors": n_actors, "directors": n_directors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, nargs="+", default=[1, 10, 100],
+                        help="catalog sizes relative to Data/ (default: 1 10 100)")
+    parser.add_argument("--output-dir", type=Path, default=Path(__file__).parent / "data")
+    parser.add_argument("--source-dir", type=Path, default=SOURCE_DIR)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    stats = read_source(args.source_dir)
+    for scale in args.scale:
+        target = args.output_dir / f"x{scale:g}"
+        counts = generate(target, scale, stats, args.seed)
+        print(f"{target}: {counts['movies']} movies, {counts['actors']} actors, {counts['directors']} directors")
+
+
+if __name__ == "__main__":
+    main()
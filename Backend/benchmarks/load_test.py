@@ -0,0 +1,133 @@
+"""Async closed-loop load driver for the read endpoints.
+
+Runs --concurrency workers for --duration seconds (after --warmup), each
+issuing requests drawn from a weighted endpoint mix with names taken from the
+dataset, then reports p50/p95/p99 and throughput per endpoint as JSON.
+
+    python -m benchmarks.load_test --standin benchmarks/data/x10 --output results/x10.json
+    python -m benchmarks.load_test --base-url http://localhost:8800 --data-dir ../Data
+"""
+import argparse
+import asyncio
+import csv
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import quote
+
+import httpx
+
+from benchmarks.common import compare_to_baseline, latency_summary, load_app, run_metadata, write_report
+from benchmarks.standin import StandInGraph
+
+# endpoint -> (权重, 路径模板, 取值来源)
+ENDPOINTS = {
+    "movie_cast": (20, "/movies/{}/cast", "movies"),
+    "actor_filmography": (20, "/actors/{}/filmography", "actors"),
+    "autocomplete_actor": (20, "/autocomplete/actor?query={}", "actor_prefixes"),
+    "search_movie": (15, "/search/movie?query={}", "movie_fragments"),
+    "read_movie": (10, "/movies/{}", "movies"),
+    "director_filmography": (5, "/directors/{}/filmography", "directors"),
+    "movie_directors": (5, "/movies/{}/directors", "movies"),
+    "actor_directors": (3, "/actors/{}/directors", "actors"),
+    "director_actors": (1, "/directors/{}/actors", "directors"),
+    "list_actors": (1, "/actors", None),
+}
+
+
+def load_names(data_dir: Path):
+    # 只取实际出现在电影里的演员/导演，避免大量 404 扭曲延迟分布
+    with open(data_dir / "movies.csv", encoding="utf-8-sig") as f:
+        rows = list(csv.DictReader(f))
+    movies = [row["中文名"] for row in rows]
+    actors = sorted({a.strip() for row in rows for a in row["演员"].split("、") if a.strip()})
+    directors = sorted({d.strip() for row in rows for d in row["导演"].split("、") if d.strip()})
+    return {
+        "movies": movies,
+        "actors": actors,
+        "directors": directors,
+        "actor_prefixes": sorted({a[:1] for a in actors} | {a[:2] for a in actors}),
+        "movie_fragments": sorted({t[i:i + 2] for t in movies for i in range(0, max(1, len(t) - 1), 2)}),
+    }
+
+
+async def worker(client, plan, names, rng, deadline, record_after, samples, errors):
+    labels, weights = zip(*((label, spec[0]) for label, spec in plan.items()))
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            return
+        label = rng.choices(labels, weights)[0]
+        _, template, source = plan[label]
+        path = template.format(quote(rng.choice(names[source]))) if source else template
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            failed = True
+        elapsed = time.perf_counter() - start
+        if start >= record_after:
+            samples[label].append(elapsed)
+            if failed:
+                errors[label] += 1
+
+
+async def run(args):
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+    else:
+        main = load_app(StandInGraph().load_csvs(args.standin) if args.standin else None)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                   base_url="http://bench", timeout=args.timeout)
+
+    names = load_names(args.data_dir or args.standin or Path("../Data"))
+    plan = {label: spec for label, spec in ENDPOINTS.items() if not args.endpoints or label in args.endpoints}
+    samples, errors = defaultdict(list), defaultdict(int)
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    record_after = start + args.warmup
+    deadline = record_after + args.duration
+    async with client:
+        await asyncio.gather(*(
+            worker(client, plan, names, random.Random(rng.random()), deadline, record_after, samples, errors)
+            for _ in range(args.concurrency)
+        ))
+
+    results = {label: latency_summary(samples[label], errors[label], args.duration) for label in plan}
+    results["overall"] = latency_summary([s for label in plan for s in samples[label]],
+                                         sum(errors.values()), args.duration)
+    return {"meta": run_metadata(args), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--base-url", help="load a running server (default: in-process app on NEO4J_URI)")
+    target.add_argument("--standin", type=Path, help="serve this generated dataset from the in-memory stand-in")
+    parser.add_argument("--data-dir", type=Path, help="dataset to draw names from (default: --standin or ../Data)")
+    parser.add_argument("--endpoints", nargs="+", choices=sorted(ENDPOINTS), help="restrict the mix")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unrecorded seconds before measuring")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path, help="previous report to compare p99 against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p99 regression (fraction)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    write_report(report, args.output)
+    if args.baseline:
+        regressions = compare_to_baseline(report["results"], args.baseline, "p99_ms", args.tolerance)
+        if regressions:
+            print("Latency regressed:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
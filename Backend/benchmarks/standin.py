@@ -0,0 +1,363 @@
+"""In-process stand-in for Neo4j, used when no database is available.
+
+It keeps the catalog in dictionaries and answers the queries issued by
+main.py (reads, the write endpoints and the orphan sweep), dispatching on the
+query name that run_query publishes in main.current_query rather than on the
+Cypher text, so reformatting a statement cannot route it to the wrong
+handler. Read handlers return the same projected maps as the real queries,
+so benchmarks measure the API layer (routing, serialization, middleware)
+without network or page-cache noise. A query name it does not know raises,
+which shows up as a 500 in results instead of silently returning nothing.
+"""
+import csv
+import time
+from collections import defaultdict
+from functools import partial
+from pathlib import Path
+
+from py2neo import Node
+
+KEYS = {"Actor": "name", "Director": "name", "Movie": "title"}
+REL_TYPES = ("ACTED_IN", "DIRECTED", "COOPERATED_WITH")
+# 与 main.MOVIE_PROJECTION / PERSON_PROJECTION 的字段一致
+MOVIE_FIELDS = ("title", "english_title", "genres", "release_date", "cover_path")
+PERSON_FIELDS = ("name", "photo_path")
+
+
+def _key(node):
+    label = next(iter(node.labels))
+    return label, node[KEYS[label]]
+
+
+def _project(node, fields):
+    # Cypher map projection：只取指定属性，缺失的属性为 None
+    return {field: node.get(field) for field in fields}
+
+
+class StandInCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def data(self):
+        return self.rows
+
+    def evaluate(self):
+        return next(iter(self.rows[0].values())) if self.rows else None
+
+    def plan(self):
+        return None
+
+
+class StandInMatch:
+    def __init__(self, graph, label, properties):
+        self.graph = graph
+        self.label = label
+        self.properties = properties
+
+    def _query_and_parameters(self):
+        predicates = " AND ".join(f"_.{k} = ${k}" for k in self.properties)
+        where = f" WHERE {predicates}" if predicates else ""
+        return f"MATCH (_:{self.label}){where} RETURN _", dict(self.properties)
+
+    def __iter__(self):
+        key = KEYS[self.label]
+        if set(self.properties) == {key}:
+            node = self.graph.nodes[self.label].get(self.properties[key])
+            return iter([node] if node is not None else [])
+        return (node for node in self.graph.nodes[self.label].values()
+                if all(node.get(k) == v for k, v in self.properties.items()))
+
+    def first(self):
+        return next(iter(self), None)
+
+
+class StandInMatcher:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def match(self, label, **properties):
+        return StandInMatch(self.graph, label, properties)
+
+
+class StandInGraph:
+    def __init__(self):
+        self.nodes = {label: {} for label in KEYS}
+        # (relationship type, start key) -> {end key}，以及反向索引
+        self.out_edges = defaultdict(set)
+        self.in_edges = defaultdict(set)
+        self.writes = 0
+        self.delays = {}  # 查询名 -> 额外耗时（秒），用来模拟慢查询，复现并发时序问题
+        # main.py 中的查询名 -> 处理函数
+        self.handlers = {
+            "health": self._ping,
+            **dict.fromkeys(("clear", "import_clear", "bulk_import_clear"), self._clear),
+            # 建索引和 LOAD CSV 在替身里没有意义
+            **dict.fromkeys(("warmup_index", "bulk_import_index", "bulk_import_actors",
+                             "bulk_import_directors", "bulk_import_movies"), self._noop),
+            "list_actors": partial(self._list_people, "Actor"),
+            "list_directors": partial(self._list_people, "Director"),
+            "list_movies": self._list_movies,
+            "actor_filmography": partial(self._filmography, "Actor", "ACTED_IN"),
+            "director_filmography": partial(self._filmography, "Director", "DIRECTED"),
+            "movie_cast": partial(self._movie_people, "Actor", "ACTED_IN"),
+            "movie_cast_fallback": partial(self._movie_people, "Actor", "ACTED_IN"),
+            "movie_directors": partial(self._movie_people, "Director", "DIRECTED"),
+            "director_actors": self._director_actors,
+            "actor_directors": self._actor_directors,
+            "autocomplete_actor": partial(self._autocomplete, "Actor", "name"),
+            "autocomplete_movie": partial(self._autocomplete, "Movie", "title"),
+            "search_actor": partial(self._search, "Actor", "name"),
+            "search_movie": partial(self._search, "Movie", "title"),
+            "search_director": partial(self._search, "Director", "name"),
+            "actor_in_movie": partial(self._link, "Actor", "ACTED_IN"),
+            "director_in_movie": partial(self._link, "Director", "DIRECTED"),
+            "delete_actor": self._delete_actor,
+            "delete_movie": self._delete_movie,
+            "delete_director": self._delete_director,
+            "stats_rebuild_movies": self._movie_stats,
+            "stats_rebuild_actors": partial(self._count_nodes, "Actor"),
+            "stats_rebuild_directors": partial(self._count_nodes, "Director"),
+            "sweep_orphan_actors": partial(self._sweep_orphans, "Actor", "ACTED_IN"),
+            "sweep_orphan_directors": partial(self._sweep_orphans, "Director", "DIRECTED"),
+            "sweep_stale_cooperation": self._sweep_cooperation,
+        }
+
+    # ---------- py2neo Graph API used by main.py ----------
+
+    def run(self, cypher, **params):
+        from main import current_query  # main 已由 common.load_app 导入；这里导入避免提前读取它的环境变量
+        name = current_query.get()
+        handler = self.handlers.get(name)
+        if handler is None:
+            raise ValueError(f"Stand-in graph has no handler for query {name!r}: {' '.join(cypher.split())[:120]}")
+        rows = handler(params)
+        if name in self.delays:
+            time.sleep(self.delays[name])  # 结果已按开始时的数据算好，像 Neo4j 的事务快照一样
+        return StandInCursor(rows)
+
+    def evaluate(self, cypher, **params):
+        return self.run(cypher, **params).evaluate()
+
+    def create(self, node):
+        self.merge(node)
+
+    def merge(self, subgraph, label=None, key=None):
+        self.writes += 1
+        if isinstance(subgraph, Node):
+            label, value = _key(subgraph)
+            existing = self.nodes[label].get(value)
+            if existing is not None:
+                existing.update(subgraph)
+            else:
+                self.nodes[label][value] = subgraph
+            return
+        rel_type = type(subgraph).__name__
+        start, end = _key(subgraph.start_node), _key(subgraph.end_node)
+        self.out_edges[(rel_type, start)].add(end)
+        self.in_edges[(rel_type, end)].add(start)
+
+    def delete(self, node):
+        self.writes += 1
+        key = _key(node)
+        self.nodes[key[0]].pop(key[1], None)
+        for rel_type in REL_TYPES:
+            for end in self.out_edges.pop((rel_type, key), ()):
+                self.in_edges[(rel_type, end)].discard(key)
+            for start in self.in_edges.pop((rel_type, key), ()):
+                self.out_edges[(rel_type, start)].discard(key)
+
+    def _unlink(self, rel_type, start, end):
+        self.writes += 1
+        self.out_edges[(rel_type, start)].discard(end)
+        self.in_edges[(rel_type, end)].discard(start)
+
+    def _worked_together(self, actor, director):
+        # 演员和导演是否还有共同作品（ACTED_IN 与 DIRECTED 指向同一部电影）
+        return not self.out_edges.get(("ACTED_IN", actor), set()).isdisjoint(
+            self.out_edges.get(("DIRECTED", director), ()))
+
+    # ---------- bulk loading ----------
+
+    def load_csvs(self, data_dir: Path):
+        # 直接从 CSV 构建内存图，语义与 /bulk_import 相同，但不逐条走 merge
+        data_dir = Path(data_dir)
+        for filename, label, folder in (("actors.csv", "Actor", "actor_photos"),
+                                        ("directors.csv", "Director", "director_photos")):
+            with open(data_dir / filename, encoding="utf-8-sig") as f:
+                for row in csv.DictReader(f):
+                    self.nodes[label][row["姓名"]] = Node(label, name=row["姓名"],
+                                                        photo_path=f"/Data/{folder}/{row['行号']}.jpg")
+        with open(data_dir / "movies.csv", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                title = row["中文名"]
+                self.nodes["Movie"][title] = Node("Movie", title=title, english_title=row["英文名"],
+                                                  genres=row["类型"], release_date=row["上映时间"],
+                                                  cover_path=f"/Data/movie_covers/{row['行号']}_海报.jpg")
+                movie = ("Movie", title)
+                actors = [("Actor", a.strip()) for a in row["演员"].split("、") if a.strip()]
+                directors = [("Director", d.strip()) for d in row["导演"].split("、") if d.strip()]
+                for rel_type, people in (("ACTED_IN", actors), ("DIRECTED", directors)):
+                    for person in people:
+                        self.nodes[person[0]].setdefault(person[1], Node(person[0], name=person[1]))
+                        self.out_edges[(rel_type, person)].add(movie)
+                        self.in_edges[(rel_type, movie)].add(person)
+                for director in directors:
+                    for actor in actors:
+                        self.out_edges[("COOPERATED_WITH", actor)].add(director)
+                        self.in_edges[("COOPERATED_WITH", director)].add(actor)
+        return self
+
+    # ---------- query handlers ----------
+
+    def _get(self, key):
+        return self.nodes[key[0]].get(key[1])
+
+    def _ping(self, params):
+        return [{"ok": 1}]
+
+    def _noop(self, params):
+        return []
+
+    def _clear(self, params):
+        self.__init__()
+        return []
+
+    def _count_nodes(self, label, params):
+        return [{"n": len(self.nodes[label])}]
+
+    def _movie_stats(self, params):
+        # main.ALL_MOVIE_STATS_QUERY：每部电影一行，供 /stats 重建
+        rows = []
+        for title, movie in self.nodes["Movie"].items():
+            key = ("Movie", title)
+            rows.append({"title": title, "genres": movie.get("genres"), "release_date": movie.get("release_date"),
+                         "cast_size": len(self.in_edges.get(("ACTED_IN", key), ())),
+                         "directors": [k[1] for k in self.in_edges.get(("DIRECTED", key), ())]})
+        return rows
+
+    def _link(self, label, rel_type, params):
+        # main.ACTOR_IN_MOVIE_QUERY / DIRECTOR_IN_MOVIE_QUERY：MERGE 关系，返回是否新建和建边后的人数
+        person, movie = (label, params["name"]), ("Movie", params["title"])
+        if self._get(person) is None or self._get(movie) is None:
+            return []
+        created = movie not in self.out_edges.get((rel_type, person), ())
+        if created:
+            self.writes += 1
+            self.out_edges[(rel_type, person)].add(movie)
+            self.in_edges[(rel_type, movie)].add(person)
+        return [{"created": created, "cast_size": len(self.in_edges[(rel_type, movie)])}]
+
+    def _delete_actor(self, params):
+        actor = self.nodes["Actor"].get(params["name"])
+        if actor is None:
+            return []
+        movies = self.out_edges.get(("ACTED_IN", ("Actor", params["name"])), ())
+        cast_sizes = [len(self.in_edges.get(("ACTED_IN", movie), ())) for movie in movies]
+        self.delete(actor)
+        return [{"cast_sizes": cast_sizes}]
+
+    def _delete_director(self, params):
+        director = self.nodes["Director"].get(params["name"])
+        if director is not None:
+            self.delete(director)
+        return [{"n": int(director is not None)}]
+
+    def _delete_movie(self, params):
+        # main.DELETE_MOVIE_QUERY：删除电影，并删掉因此不再有共同作品的演员-导演合作关系
+        movie = self.nodes["Movie"].get(params["title"])
+        if movie is None:
+            return []
+        key = ("Movie", params["title"])
+        actors = list(self.in_edges.get(("ACTED_IN", key), ()))
+        directors = list(self.in_edges.get(("DIRECTED", key), ()))
+        self.delete(movie)
+        stale_pairs = 0
+        for actor in actors:
+            for director in directors:
+                if director in self.out_edges.get(("COOPERATED_WITH", actor), ()) \
+                        and not self._worked_together(actor, director):
+                    self._unlink("COOPERATED_WITH", actor, director)
+                    stale_pairs += 1
+        return [{"genres": movie.get("genres"), "release_date": movie.get("release_date"),
+                 "cast_size": len(actors), "actors": [k[1] for k in actors],
+                 "directors": [k[1] for k in directors], "stale_pairs": stale_pairs}]
+
+    def _sweep_orphans(self, label, rel_type, params):
+        removed = 0
+        for name in params["names"]:
+            node = self.nodes[label].get(name)
+            if node is not None and not self.out_edges.get((rel_type, (label, name))):
+                self.delete(node)
+                removed += 1
+        return [{"removed": removed}]
+
+    def _sweep_cooperation(self, params):
+        # main.STALE_COOPERATION_QUERY：按导演名滚动检查一批
+        names = sorted(name for name in self.nodes["Director"] if name > params["after"])[:params["batch"]]
+        removed = 0
+        for name in names:
+            director = ("Director", name)
+            for actor in list(self.in_edges.get(("COOPERATED_WITH", director), ())):
+                if not self._worked_together(actor, director):
+                    self._unlink("COOPERATED_WITH", actor, director)
+                    removed += 1
+        return [{"last": names[-1] if names else None, "removed": removed}]
+
+    def _list_people(self, label, params):
+        return [_project(node, PERSON_FIELDS) for node in self.nodes[label].values()]
+
+    def _list_movies(self, params):
+        return [{"movie": _project(node, MOVIE_FIELDS)} for node in self.nodes["Movie"].values()]
+
+    def _filmography(self, label, rel_type, params):
+        person = self.nodes[label].get(params["name"])
+        movies = [self._get(k) for k in self.out_edges.get((rel_type, (label, params["name"])), ())]
+        if person is None or not movies:
+            return []
+        movies.sort(key=lambda m: m["title"])
+        movies.sort(key=lambda m: m.get("release_date") or "", reverse=True)
+        return [{label.lower(): _project(person, PERSON_FIELDS),
+                 "movies": [_project(movie, MOVIE_FIELDS) for movie in movies]}]
+
+    def _movie_people(self, label, rel_type, params):
+        movie = self.nodes["Movie"].get(params["title"])
+        if movie is None:
+            return []
+        people = sorted((self._get(k) for k in self.in_edges.get((rel_type, ("Movie", params["title"])), ())),
+                        key=lambda n: n["name"])
+        return [{"movie": _project(movie, MOVIE_FIELDS),
+                 "actors" if label == "Actor" else "directors": [_project(p, PERSON_FIELDS) for p in people]}]
+
+    def _director_actors(self, params):
+        actors = [self._get(k) for k in self.in_edges.get(("COOPERATED_WITH", ("Director", params["name"])), ())]
+        if not actors:
+            return []
+        return [{"director": _project(self.nodes["Director"][params["name"]], PERSON_FIELDS),
+                 "actors": [_project(actor, PERSON_FIELDS) for actor in actors]}]
+
+    def _actor_directors(self, params):
+        directors = [self._get(k) for k in self.out_edges.get(("COOPERATED_WITH", ("Actor", params["name"])), ())]
+        if not directors:
+            return []
+        return [{"actor": _project(self.nodes["Actor"][params["name"]], PERSON_FIELDS),
+                 "directors": [_project(director, PERSON_FIELDS) for director in directors]}]
+
+    def _matches(self, label, prop, needle):
+        # 与 main 中的 CONTAINS + relevance 排序相同：完全匹配 0，前缀匹配 1，其他 2
+        needle = needle.lower()
+        hits = []
+        for node in self.nodes[label].values():
+            value = (node.get(prop) or "").lower()
+            if needle in value:
+                relevance = 0 if value == needle else 1 if value.startswith(needle) else 2
+                hits.append((relevance, node[prop], node))
+        hits.sort(key=lambda h: (h[0], h[1]))
+        return hits
+
+    def _autocomplete(self, label, prop, params):
+        return [{"name": name, "relevance": relevance}
+                for relevance, name, _ in self._matches(label, prop, params["query"])[:10]]
+
+    def _search(self, label, prop, params):
+        # /search 返回整个节点（RETURN n）
+        return [{"n": node} for _, _, node in self._matches(label, prop, params["query"])[:20]]
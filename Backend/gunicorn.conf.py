@@ -0,0 +1,52 @@
+"""Multi-worker deployment: gunicorn managing uvicorn workers.
+
+    cd Backend && gunicorn -c gunicorn.conf.py main:app
+
+Workers default to one per CPU ($WEB_CONCURRENCY overrides). The master starts
+the shared cache server before forking so every worker sees the same cached
+responses and catalog stats; set SHARED_CACHE_SOCKET to use one started
+separately (python shared_cache.py --socket ...).
+
+Each worker also publishes its counters, histograms and slow-query log to the
+shared cache every METRICS_PUBLISH_INTERVAL seconds (default 5), so /metrics
+and /debug/slow-queries on any worker report the total across all workers,
+including ones that have exited; values from other workers can lag by up to
+that interval.
+
+The response cache is off unless RESPONSE_CACHE_TTL is set. Its invalidations
+only reach workers on this host, so enable it only when this host is the
+only instance serving the API and every write goes through it; with several
+replicas, or writes made directly in Neo4j, other instances would serve stale
+reads for up to the TTL.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from shared_cache import start_server_process  # noqa: E402
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8800')}"
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+# UvicornWorker 的心跳由事件循环发出。导入、预热、统计重建等阻塞调用都在线程池里执行，
+# 不会让事件循环停住超过这个时间；就绪状态由 /health/ready 反映
+timeout = 60
+graceful_timeout = 30
+
+_cache_server = None
+
+
+def on_starting(server):
+    global _cache_server
+    if not os.getenv("SHARED_CACHE_SOCKET"):
+        socket_path = os.path.join(tempfile.gettempdir(), f"movie-api-cache-{os.getpid()}.sock")
+        _cache_server = start_server_process(socket_path)
+        os.environ["SHARED_CACHE_SOCKET"] = socket_path
+        server.log.info(f"Shared cache server listening on {socket_path}")
+
+
+def on_exit(server):
+    if _cache_server is not None:
+        _cache_server.terminate()
@@ -1,7 +1,8 @@
 import os
 from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from py2neo import Graph, Node, Relationship, NodeMatcher
 from typing import Optional, List
@@ -12,8 +13,37 @@ from datetime import datetime
 import asyncio
 from pathlib import Path
 import csv
-
-app = FastAPI()
+import json
+import time
+import bisect
+import random
+import threading
+import functools
+import inspect
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from shared_cache import CacheError, create_store
+
+try:
+    import orjson  # 可选依赖：未安装时退回标准库 json
+except ImportError:
+    orjson = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 连接和预热在后台进行：进程立即响应存活探测，预热完成后才报告 ready
+    startup = asyncio.create_task(start_services())
+    publisher = asyncio.create_task(run_metrics_publisher()) if shared_store.shared else None
+    yield
+    startup.cancel()
+    if publisher is not None:
+        publisher.cancel()
+    await stop_services()
+
+app = FastAPI(lifespan=lifespan)
 
 # Update root endpoint
 @app.get("/", response_class=HTMLResponse)
@@ -35,14 +65,617 @@ NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
 
 PORT = os.getenv("PORT",8800)
 
-# Connect to Neo4j
-graph = Graph(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD),name="neo4j")
-matcher = NodeMatcher(graph)
+# /import 读取 CSV 的目录（基准测试会指向生成的合成数据）
+DATA_DIR = os.getenv("DATA_DIR", "../Data")
+
+NEO4J_CONNECT_RETRIES = int(os.getenv("NEO4J_CONNECT_RETRIES", 0))          # 0 表示一直重试
+NEO4J_CONNECT_BACKOFF = float(os.getenv("NEO4J_CONNECT_BACKOFF", 0.5))       # 首次重试等待（秒），之后翻倍
+NEO4J_CONNECT_BACKOFF_MAX = float(os.getenv("NEO4J_CONNECT_BACKOFF_MAX", 30))
+WARMUP_ENABLED = os.getenv("WARMUP", "1") != "0"
+
+# Neo4j 连接在 lifespan 中建立（见 LIFECYCLE），导入模块时不连接数据库
+graph = None
+matcher = None
+
+def set_graph(new_graph, new_matcher=None):
+    global graph, matcher
+    graph = new_graph
+    matcher = new_matcher if new_matcher is not None else NodeMatcher(new_graph)
+
+def connect_neo4j():
+    # 单次连接尝试，失败直接抛出；重试由 retry_with_backoff 负责
+    new_graph = Graph(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD), name="neo4j")
+    new_graph.run("RETURN 1").evaluate()
+    set_graph(new_graph)
+    logging.info(f"Connected to Neo4j at {NEO4J_URI}")
+    return new_graph
 
 # Set up logging
 logging.basicConfig(filename='api_log.txt', level=logging.INFO, 
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
+# ============================= METRICS =============================
+
+# 延迟直方图的桶边界（秒），与 Prometheus 默认桶保持一致
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # 非累计计数，输出时再累加
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        idx = bisect.bisect_left(self.buckets, value)
+        if idx < len(self.counts):
+            self.counts[idx] += 1
+
+    def add(self, counts, total, count):
+        # 合并另一个进程同样分桶的直方图
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.sum += total
+        self.count += count
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.http_requests = defaultdict(int)          # (method, route, status) -> count
+        self.http_exceptions = defaultdict(int)        # (method, route) -> count
+        self.http_duration = defaultdict(Histogram)    # (method, route) -> 总耗时
+        self.http_db_duration = defaultdict(Histogram) # (method, route) -> 其中 Neo4j 耗时
+        self.query_duration = defaultdict(Histogram)   # query name -> 耗时
+        self.query_rows = defaultdict(int)             # query name -> 返回行数
+        self.query_errors = defaultdict(int)           # query name -> 失败次数
+        self.slow_queries = defaultdict(int)           # query name -> 超过慢查询阈值次数
+        self.singleflight_calls = defaultdict(int)     # query name -> 实际发往 Neo4j 的次数
+        self.singleflight_coalesced = defaultdict(int) # query name -> 搭便车复用结果的次数
+        self.response_cache = defaultdict(int)         # (handler, local/shared/miss) -> 次数
+        self.cache_errors = defaultdict(int)           # operation -> 共享缓存不可用次数
+        self.swept = defaultdict(int)                  # kind -> 后台清理删除的节点/边数
+
+    def request_started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def request_finished(self, method, route, status, elapsed, db_elapsed, failed=False):
+        with self.lock:
+            self.in_flight -= 1
+            self.http_requests[(method, route, status)] += 1
+            self.http_duration[(method, route)].observe(elapsed)
+            self.http_db_duration[(method, route)].observe(db_elapsed)
+            if failed:
+                self.http_exceptions[(method, route)] += 1
+
+    def observe_query(self, name, elapsed, rows, error=False):
+        with self.lock:
+            self.query_duration[name].observe(elapsed)
+            self.query_rows[name] += rows
+            if error:
+                self.query_errors[name] += 1
+
+    def observe_slow_query(self, name):
+        with self.lock:
+            self.slow_queries[name] += 1
+
+    def observe_singleflight(self, name, coalesced):
+        with self.lock:
+            if coalesced:
+                self.singleflight_coalesced[name] += 1
+            else:
+                self.singleflight_calls[name] += 1
+
+    def observe_response_cache(self, handler, result):
+        with self.lock:
+            self.response_cache[(handler, result)] += 1
+
+    def observe_cache_error(self, operation):
+        with self.lock:
+            self.cache_errors[operation] += 1
+
+    def observe_sweep(self, kind, removed):
+        with self.lock:
+            self.swept[kind] += removed
+
+    def snapshot(self) -> dict:
+        """Return this process's counters and histograms as JSON-serializable data."""
+        with self.lock:
+            return {
+                "in_flight": self.in_flight,
+                "counters": {attr: [[_label_values(key), value] for key, value in getattr(self, attr).items()]
+                             for attr, *_ in COUNTER_FAMILIES},
+                "histograms": {attr: [[_label_values(key), list(hist.counts), hist.sum, hist.count]
+                                      for key, hist in getattr(self, attr).items()]
+                               for attr, *_ in HISTOGRAM_FAMILIES},
+            }
+
+    def render(self) -> str:
+        return render_metrics([self.snapshot()])
+
+# (Metrics 属性, 指标名, 说明, 标签名)
+COUNTER_FAMILIES = (
+    ("http_requests", "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")),
+    ("http_exceptions", "http_request_exceptions_total", "Unhandled exceptions raised by route handlers",
+     ("method", "route")),
+    ("query_rows", "neo4j_query_rows_total", "Rows returned by named Cypher queries", ("query",)),
+    ("query_errors", "neo4j_query_errors_total", "Failed named Cypher queries", ("query",)),
+    ("slow_queries", "neo4j_slow_queries_total", "Named Cypher queries over the slow-query threshold", ("query",)),
+    ("singleflight_calls", "neo4j_singleflight_calls_total", "Shared read queries actually sent to Neo4j",
+     ("query",)),
+    ("singleflight_coalesced", "neo4j_singleflight_coalesced_total",
+     "Read queries served from an identical in-flight call", ("query",)),
+    ("response_cache", "response_cache_lookups_total", "Cached read responses by where they were found",
+     ("handler", "result")),
+    ("cache_errors", "shared_cache_errors_total", "Shared cache operations that failed", ("operation",)),
+    ("swept", "orphan_sweep_removed_total", "Orphaned people and stale COOPERATED_WITH edges removed", ("kind",)),
+)
+HISTOGRAM_FAMILIES = (
+    ("http_duration", "http_request_duration_seconds", "End-to-end request latency", ("method", "route")),
+    ("http_db_duration", "http_request_neo4j_seconds", "Time spent in Neo4j per request", ("method", "route")),
+    ("query_duration", "neo4j_query_duration_seconds", "Latency of named Cypher queries", ("query",)),
+)
+
+def _label_values(key):
+    return list(key) if isinstance(key, tuple) else [key]
+
+def render_metrics(snapshots) -> str:
+    # Prometheus text exposition format (version 0.0.4)；多个进程的快照按标签相加
+    in_flight = 0
+    counters = {attr: defaultdict(int) for attr, *_ in COUNTER_FAMILIES}
+    histograms = {attr: defaultdict(Histogram) for attr, *_ in HISTOGRAM_FAMILIES}
+    for snapshot in snapshots:
+        in_flight += snapshot["in_flight"]
+        for attr, samples in snapshot["counters"].items():
+            for key, value in samples if attr in counters else ():  # 滚动升级时旧版本进程可能多出指标
+                counters[attr][tuple(key)] += value
+        for attr, samples in snapshot["histograms"].items():
+            for key, counts, total, count in samples if attr in histograms else ():
+                histograms[attr][tuple(key)].add(counts, total, count)
+
+    lines = ["# HELP http_requests_in_flight Requests currently being served",
+             "# TYPE http_requests_in_flight gauge",
+             f"http_requests_in_flight {in_flight}"]
+    for attr, name, help_text, label_names in COUNTER_FAMILIES:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for key, value in sorted(counters[attr].items()):
+            lines.append(f"{name}{_format_labels(dict(zip(label_names, key)))} {value}")
+    for attr, name, help_text, label_names in HISTOGRAM_FAMILIES:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, hist in sorted(histograms[attr].items()):
+            labels = dict(zip(label_names, key))
+            cumulative = 0
+            for bound, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {hist.count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist.count}")
+    return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+# 当前请求的上下文：scope（用于取路由模板）和累计的 Neo4j 耗时，由中间件设置
+_request_context = ContextVar("request_context", default=None)
+
+def _route_label(scope):
+    # 使用路由模板（如 /movies/{title}/cast）而不是原始路径，避免标签爆炸。
+    # /docs、/openapi.json 由 Starlette 的 Route 处理，不设置 scope["route"]，用它们注册的路径；
+    # 没有匹配任何路由的任意路径统一记为 <unmatched>
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if any(getattr(r, "path", None) == scope["path"] for r in app.routes):
+        return scope["path"]
+    return "<unmatched>"
+
+def _current_route():
+    ctx = _request_context.get()
+    if ctx is None:
+        return None
+    return _route_label(ctx["scope"])
+
+# ============================= SLOW QUERIES =============================
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 200))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", 1.0))       # 被 PROFILE 的慢查询比例
+SLOW_QUERY_PROFILE_INTERVAL = float(os.getenv("SLOW_QUERY_PROFILE_INTERVAL", 60)) # 同一查询两次 PROFILE 的最小间隔（秒）
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", 200))
+
+# 含写操作的语句不能重跑，只记录不 PROFILE
+_WRITE_CLAUSE = re.compile(r"\b(CREATE|MERGE|DELETE|SET|REMOVE|DROP|FOREACH|LOAD\s+CSV)\b", re.IGNORECASE)
+# 过程调用（db.awaitIndexes、apoc.warmup.run 等）重跑一遍就是再做一次同样的维护工作
+_PROCEDURE_CALL = re.compile(r"^\s*CALL\s+[\w.]+\s*\(", re.IGNORECASE)
+
+def _summarize_plan(plan: dict) -> dict:
+    # 把 PROFILE 返回的执行计划树压平成 db hits / 算子列表 / 是否使用索引
+    operators, db_hits = [], 0
+    stack = [plan]
+    while stack:
+        op = stack.pop()
+        operators.append(op.get("operatorType", "?").split("@")[0])
+        db_hits += op.get("dbHits", 0) or 0
+        stack.extend(reversed(op.get("children", [])))
+    return {
+        "db_hits": db_hits,
+        "rows": plan.get("rows"),
+        "operators": operators,
+        "index_used": any("Index" in op for op in operators),
+        "label_scans": [op for op in operators if op in ("NodeByLabelScan", "AllNodesScan")],
+    }
+
+class SlowQueryLog:
+    def __init__(self, maxlen=SLOW_QUERY_LOG_SIZE):
+        self.lock = threading.Lock()
+        self.entries = deque(maxlen=maxlen)
+        self.last_profiled = {}  # query name -> 上次 PROFILE 的时间
+        # 单线程执行 PROFILE，既不阻塞请求，也不会对数据库造成并发压力
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-profiler")
+
+    def capture(self, name, cypher, params, elapsed, profile=True):
+        entry = {
+            "query": name,
+            "route": _current_route(),
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "timestamp": datetime.utcnow().isoformat(),
+            "cypher": " ".join(cypher.split()) if cypher is not None else None,  # timed_write 没有语句文本
+            "parameters": params or {},
+            "profile_status": "pending",
+            "profile": None,
+        }
+        now = time.monotonic()
+        with self.lock:
+            if cypher is None or _WRITE_CLAUSE.search(cypher):
+                entry["profile_status"] = "skipped: write statement"
+            elif not profile or entry["route"] is None or _PROCEDURE_CALL.match(cypher):
+                # 启动、预热、统计重建、后台清理等维护查询：慢是预期的，PROFILE 只会把工作再做一遍
+                entry["profile_status"] = "skipped: maintenance query"
+            elif random.random() >= SLOW_QUERY_SAMPLE_RATE:
+                entry["profile_status"] = "skipped: not sampled"
+            elif now - self.last_profiled.get(name, float("-inf")) < SLOW_QUERY_PROFILE_INTERVAL:
+                entry["profile_status"] = "skipped: rate limited"
+            else:
+                self.last_profiled[name] = now
+            self.entries.append(entry)
+        metrics.observe_slow_query(name)
+        logging.warning(f"Slow query {name} on {entry['route']}: {entry['elapsed_ms']}ms")
+        if entry["profile_status"] == "pending":
+            self.executor.submit(self._profile, entry, cypher, params or {})
+
+    def _profile(self, entry, cypher, params):
+        # 直接调用 graph.run，避免 PROFILE 本身再被计入指标或慢查询
+        try:
+            cursor = graph.run("PROFILE " + cypher, **params)
+            cursor.data()
+            plan = cursor.plan()
+            entry["profile"] = _summarize_plan(plan) if plan else None
+            entry["profile_status"] = "done" if plan else "failed: no plan returned"
+        except Exception as e:
+            entry["profile_status"] = f"failed: {str(e)}"
+
+    def snapshot(self, query=None, limit=50):
+        with self.lock:
+            entries = list(self.entries)
+        if query:
+            entries = [e for e in entries if e["query"] == query]
+        return entries[::-1][:limit]  # 最新的在前
+
+slow_queries = SlowQueryLog()
+
+# 正在执行的命名查询，由 track_query 设置；benchmarks/standin.py 按这个名字而不是语句文本分派查询
+current_query = ContextVar("current_query", default=None)
+
+@contextmanager
+def track_query(name: str, cypher: Optional[str] = None, params: Optional[dict] = None, profile: bool = True):
+    stats = {"rows": 0}
+    token = current_query.set(name)
+    start = time.perf_counter()
+    try:
+        yield stats
+    except Exception:
+        _finish_query(name, time.perf_counter() - start, 0, error=True)
+        raise
+    finally:
+        current_query.reset(token)
+    elapsed = time.perf_counter() - start
+    _finish_query(name, elapsed, stats["rows"])
+    if elapsed * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+        slow_queries.capture(name, cypher, params, elapsed, profile)
+
+def _finish_query(name, elapsed, rows, error=False):
+    metrics.observe_query(name, elapsed, rows, error)
+    ctx = _request_context.get()
+    if ctx is not None:
+        ctx["db_time"] += elapsed
+
+def run_query(query_name: str, cypher: str, /, *, profile: bool = True, **params) -> List[dict]:
+    # graph.run 的计时包装，返回 .data() 结果；profile=False 的语句即使变慢也不会被重跑 PROFILE
+    with track_query(query_name, cypher, params, profile) as stats:
+        rows = graph.run(cypher, **params).data()
+        stats["rows"] = len(rows)
+    return rows
+
+def timed_write(query_name: str, fn, /, *args):
+    # graph.merge / graph.create 的计时包装：py2neo 在内部生成 Cypher，不经过 run_query
+    with track_query(query_name) as stats:
+        result = fn(*args)
+        stats["rows"] = 1
+    return result
+
+def match_one(query_name: str, label: str, /, **properties):
+    # matcher.match(...).first() 的计时包装
+    node_match = matcher.match(label, **properties)
+    with track_query(query_name, *node_match._query_and_parameters()) as stats:
+        node = node_match.first()
+        stats["rows"] = 1 if node else 0
+    return node
+
+# ============================= SINGLE FLIGHT =============================
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT", "1") != "0"
+
+class SingleFlight:
+    # 相同 (缓存代数, query, params) 的并发读请求共享同一次 Neo4j 调用；调用结束即移除，不做缓存
+    def __init__(self):
+        self.calls = {}
+
+    async def do(self, name, key, fn):
+        task = self.calls.get(key)
+        coalesced = task is not None
+        if not coalesced:
+            # 单独的 task 执行查询：发起者的请求被取消时，其他等待者仍能拿到结果
+            task = asyncio.ensure_future(run_in_threadpool(fn))
+            self.calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        metrics.observe_singleflight(name, coalesced)
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            task.exception()  # 所有等待者都已离开时，避免 "exception was never retrieved"
+
+singleflight = SingleFlight()
+
+async def run_read_query(query_name: str, cypher: str, /, **params) -> List[dict]:
+    # 只读查询的异步入口：在线程池中执行，并合并相同的并发请求。返回的行是共享的，调用方不要修改
+    def query():
+        # 在真正发出查询时记下缓存代数；搭便车的请求拿到的也是这个代数，而不是自己到达时的
+        return response_cache.generation, run_query(query_name, cypher, **params)
+
+    if not SINGLE_FLIGHT_ENABLED:
+        generation, rows = await run_in_threadpool(query)
+    else:
+        # 键里带上缓存代数：写操作失效之后到达的请求发起新的调用，不会搭上写之前开始的查询而读到旧数据
+        key = (response_cache.generation, cypher, tuple(sorted(params.items())))
+        generation, rows = await singleflight.do(query_name, key, query)
+    observed = _read_generations.get()
+    if observed is not None:
+        observed.append(generation)
+    return rows
+
+# ============================= SERIALIZATION =============================
+
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "1") != "0"
+
+def _dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def fast_json(data):
+    # 直接编码成 bytes（Content-Length 一次确定），跳过 response_model 对每一项的二次校验；
+    # OpenAPI schema 仍由路由上的 response_model 生成。关闭时交回 FastAPI 按原流程校验
+    if not FAST_SERIALIZATION:
+        return data
+    return Response(content=_dumps(data), media_type="application/json")
+
+# Cypher map projection：只取接口需要的属性，省去整节点的传输和转换
+MOVIE_PROJECTION = "{.title, .english_title, .genres, .release_date, .cover_path}"
+PERSON_PROJECTION = "{.name, .photo_path}"
+
+def split_genres(genres):
+    return [g.strip() for g in genres.split(",")] if genres else []
+
+# ============================= SHARED CACHE =============================
+
+# 单 worker 用进程内存储；多 worker 时由启动脚本设置 SHARED_CACHE_SOCKET，所有进程共用一个缓存服务
+shared_store = create_store()
+
+# 秒，默认 0（关闭）。失效通知只能送达同一台机器上的 worker：多个副本（滚动发布、负载均衡后的多台实例）
+# 或绕过 API 直接写 Neo4j 时，其他实例会在 TTL 内返回旧数据。只在所有写入都经过这一台机器时开启
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 0))
+RESPONSE_CACHE_LOCAL_SIZE = int(os.getenv("RESPONSE_CACHE_LOCAL_SIZE", 2048))
+RESPONSE_PREFIX = "resp:"
+
+class ResponseCache:
+    # 两级缓存：进程内 LRU（命中不出进程）+ 共享存储（一个 worker 算过，其他 worker 直接用）。
+    # 写接口执行后广播失效，每个 worker 收到后清掉自己的本地副本
+    def __init__(self, store, ttl, local_size):
+        self.store = store
+        self.ttl = ttl
+        self.local_size = local_size
+        self.local = OrderedDict()  # key -> (body, expires_at)
+        self.lock = threading.Lock()
+        # 共享存储最近一次失效的代数（由失效通知同步，不会超前于服务端）。
+        # 结果带着查询开始时的代数写入：本地比较不相等、服务端比较更旧的都拒绝
+        self.generation = 0
+        store.subscribe(self._on_invalidate)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, key):
+        now = time.monotonic()
+        generation = self.generation  # 取回期间收到失效通知的话，取到的值不放进本地
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is not None and entry[1] > now:
+                self.local.move_to_end(key)
+                return entry[0], "local"
+        try:
+            value = self.store.execute({"op": "get", "key": key})[0]
+        except Exception as e:
+            metrics.observe_cache_error("get")
+            logging.warning(f"Shared cache get failed: {str(e)}")
+            return None, "miss"
+        if value is None:
+            return None, "miss"
+        body = value.encode("utf-8")
+        self._remember(key, body, generation)
+        return body, "shared"
+
+    def set(self, key, body, generation):
+        if not self._remember(key, body, generation):
+            return
+        try:
+            self.store.execute({"op": "set", "key": key, "value": body.decode("utf-8"), "ttl": self.ttl,
+                                "evictable": True, "generation": generation})
+        except Exception as e:
+            metrics.observe_cache_error("set")
+            logging.warning(f"Shared cache set failed: {str(e)}")
+
+    def _remember(self, key, body, generation):
+        with self.lock:
+            if generation != self.generation:
+                return False
+            self.local[key] = (body, time.monotonic() + self.ttl)
+            self.local.move_to_end(key)
+            while len(self.local) > self.local_size:
+                self.local.popitem(last=False)
+            return True
+
+    def invalidate(self):
+        # 不等其他 worker 的通知回到本进程，拿到新代数就立即清掉本地副本
+        try:
+            generation = self.store.execute({"op": "invalidate", "prefix": RESPONSE_PREFIX})[0]
+        except Exception as e:
+            metrics.observe_cache_error("invalidate")
+            logging.error(f"Shared cache invalidation failed: {str(e)}")
+            generation = None
+        self._on_invalidate(RESPONSE_PREFIX, generation)
+
+    def _on_invalidate(self, prefix, generation):
+        if not (prefix.startswith(RESPONSE_PREFIX) or RESPONSE_PREFIX.startswith(prefix)):
+            return
+        with self.lock:
+            if generation is not None:
+                self.generation = max(self.generation, generation)
+            for key in [k for k in self.local if k.startswith(prefix)]:
+                del self.local[key]
+
+response_cache = ResponseCache(shared_store, RESPONSE_CACHE_TTL, RESPONSE_CACHE_LOCAL_SIZE)
+
+async def store_call(func, *args):
+    # 共享缓存服务的每次操作都是一次 socket 往返，放到线程池里，缓存服务变慢时不会卡住事件循环
+    if shared_store.blocking:
+        return await run_in_threadpool(func, *args)
+    return func(*args)
+
+# cached_response 收集处理函数里各次 run_read_query 开始时的缓存代数，取最旧的写入缓存
+_read_generations = ContextVar("read_generations", default=None)
+
+def cached_response(handler):
+    """Cache a read handler's JSON response in the shared cache, keyed by its arguments."""
+    signature = inspect.signature(handler)
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        if not response_cache.enabled:
+            return await handler(*args, **kwargs)
+        arguments = signature.bind(*args, **kwargs).arguments
+        key = RESPONSE_PREFIX + handler.__name__ + ":" + json.dumps(arguments, ensure_ascii=False, sort_keys=True)
+        body, result = await store_call(response_cache.get, key)
+        metrics.observe_response_cache(handler.__name__, result)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
+        generations = []
+        token = _read_generations.set(generations)
+        try:
+            response = await handler(*args, **kwargs)
+        finally:
+            _read_generations.reset(token)
+        # 只缓存 fast_json 编好的成功响应；None（404 语义）和未启用快速序列化时的对象原样返回
+        if isinstance(response, Response) and response.status_code == 200 and generations:
+            await store_call(response_cache.set, key, response.body, min(generations))
+        return response
+    return wrapper
+
+# 未连上 Neo4j 时数据接口直接返回 503，而不是在 graph 为 None 时报 500
+NEO4J_EXEMPT_PATHS = ("/health", "/metrics", "/debug", "/docs", "/redoc", "/openapi.json")
+
+class RequestMiddleware:
+    """Record request metrics, reject data requests while Neo4j is down, and
+    invalidate cached responses after writes.
+
+    A plain ASGI middleware rather than ``@app.middleware("http")``, which
+    adds a task and a response stream to every request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        ctx = {"scope": scope, "db_time": 0.0}
+        token = _request_context.set(ctx)
+        metrics.request_started()
+        start = time.perf_counter()
+        status, failed = 500, False
+        # 任何写请求（包括中途失败、可能已部分写入的）都让缓存的读响应失效
+        pending_invalidation = scope["method"] not in ("GET", "HEAD", "OPTIONS")
+
+        async def invalidate():
+            nonlocal pending_invalidation
+            if pending_invalidation:
+                pending_invalidation = False
+                await store_call(response_cache.invalidate)
+
+        async def send_and_record(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                await invalidate()  # 客户端看到写入结果之前缓存就已失效，紧接着的读不会拿到旧响应
+            await send(message)
+
+        try:
+            path = scope["path"]
+            if graph is None and path != "/" and not path.startswith(NEO4J_EXEMPT_PATHS):
+                response = JSONResponse(status_code=503, content={"detail": "Neo4j is not available"},
+                                        headers={"Retry-After": "5"})
+                await response(scope, receive, send_and_record)
+                return
+            try:
+                await self.app(scope, receive, send_and_record)
+            finally:
+                await invalidate()
+        except Exception:
+            failed = True
+            raise
+        finally:
+            metrics.request_finished(scope["method"], _route_label(scope), status,
+                                     time.perf_counter() - start, ctx["db_time"], failed)
+            _request_context.reset(token)
+
+# 最后添加的中间件在最外层：计时包含 CORS 处理
+app.add_middleware(RequestMiddleware)
+
 # Load HTML content
 # Update the HTML content loading to use a function
 def get_html_content():
@@ -59,27 +692,35 @@ def get_html_content():
 
 # ============================= LOAD DATA =============================
 
+INDEX_STATEMENTS = (
+    "CREATE INDEX actor_name_index IF NOT EXISTS FOR (a:Actor) ON (a.name)",
+    "CREATE INDEX director_name_index IF NOT EXISTS FOR (d:Director) ON (d.name)",
+    "CREATE INDEX movie_title_index IF NOT EXISTS FOR (m:Movie) ON (m.title)",
+)
+
 @app.post("/clear")
-async def import_data():
+def import_data():
     try:
         # 清空当前 Neo4j 数据库中的所有数据
-        graph.run("MATCH (n) DETACH DELETE n")
+        run_query("clear", "MATCH (n) DETACH DELETE n")
+        catalog_stats.reset()
         
         return {"message": "DB cleared!"}
     except Exception as e:
         logging.error(f"Error clear data: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# 导入耗时较长且全是阻塞调用，用普通 def 交给线程池执行，不占住事件循环（否则 gunicorn 会因心跳超时杀掉 worker）
 @app.post("/import")
-async def import_data():
+def import_data():
     try:
         # 清空当前 Neo4j 数据库中的所有数据
-        graph.run("MATCH (n) DETACH DELETE n")
+        run_query("import_clear", "MATCH (n) DETACH DELETE n")
 
         # 定义 CSV 文件和图片文件夹路径（根据实际情况调整）
-        movie_csv = "../Data/movies.csv"
-        actor_csv = "../Data/actors.csv"
-        director_csv = "../Data/directors.csv"
+        movie_csv = os.path.join(DATA_DIR, "movies.csv")
+        actor_csv = os.path.join(DATA_DIR, "actors.csv")
+        director_csv = os.path.join(DATA_DIR, "directors.csv")
         movie_cover_folder = "/Data/movie_covers"
         actor_photo_folder = "/Data/actor_photos"
         director_photo_folder = "/Data/director_photos"
@@ -89,6 +730,7 @@ async def import_data():
         import_directors_from_csv(director_csv, director_photo_folder)
         # 导入电影,并在导入时创建相应的关系
         import_movies_from_csv(movie_csv, movie_cover_folder)
+        rebuild_stats()
         
         return {"message": "CSV数据导入成功"}
     except Exception as e:
@@ -96,14 +738,13 @@ async def import_data():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/bulk_import")
-async def bulk_import():
+def bulk_import():
     try:
-        graph.run("CREATE INDEX actor_name_index IF NOT EXISTS FOR (a:Actor) ON (a.name)")
-        graph.run("CREATE INDEX director_name_index IF NOT EXISTS FOR (d:Director) ON (d.name)")
-        graph.run("CREATE INDEX movie_title_index IF NOT EXISTS FOR (m:Movie) ON (m.title)")
+        for statement in INDEX_STATEMENTS:
+            run_query("bulk_import_index", statement)
 
         # 清空当前数据库中的所有数据
-        graph.run("MATCH (n) DETACH DELETE n")
+        run_query("bulk_import_clear", "MATCH (n) DETACH DELETE n")
 
         # CSV 文件路径（确保文件位于 Neo4j 允许访问的导入目录中）
         actor_csv_url = "file:///actors.csv"
@@ -120,7 +761,7 @@ async def bulk_import():
         }} IN TRANSACTIONS OF 500 ROWS
         RETURN 'OK' AS result;
         """
-        graph.run(query_actor)
+        run_query("bulk_import_actors", query_actor)
 
         # 2. 批量导入导演节点，直接读取 CSV 中的“行号”列
         query_director = f"""
@@ -132,7 +773,7 @@ async def bulk_import():
         }} IN TRANSACTIONS OF 500 ROWS
         RETURN 'OK' AS result;
         """
-        graph.run(query_director)
+        run_query("bulk_import_directors", query_director)
 
         # 3. 批量导入电影节点并创建关系
         query_movie = f"""
@@ -162,7 +803,8 @@ async def bulk_import():
         }} IN TRANSACTIONS OF 500 ROWS
         RETURN 'OK' AS result;
         """
-        graph.run(query_movie)
+        run_query("bulk_import_movies", query_movie)
+        rebuild_stats()
 
         return {"message": "Bulk CSV import successful using built-in LOAD CSV"}
     except Exception as e:
@@ -193,7 +835,7 @@ def import_movies_from_csv(csv_file_path: str, cover_folder: str):
                               genres=",".join(genres),
                               release_date=release_date,
                               cover_path=cover_path)
-            graph.merge(movie_node, "Movie", "title")
+            timed_write("import_merge_movie", graph.merge, movie_node, "Movie", "title")
             
             # 处理演员与导演关系（后续会建立关系）
             # 你可以在此直接调用另外的函数来建立关系：
@@ -205,39 +847,39 @@ def create_movie_relationships(movie_node, actors_str, directors_str, actor_phot
         actor_names = [name.strip() for name in actors_str.split("、") if name.strip()]
         for actor_name in actor_names:
             # 先尝试匹配已经存在的演员节点
-            actor_node_existing = matcher.match("Actor", name=actor_name).first()
+            actor_node_existing = match_one("import_match_actor", "Actor", name=actor_name)
             if actor_node_existing:
                 actor_node_to_use = actor_node_existing
             else:
                 # 如果未找到，可以选择创建新节点，但使用默认或空的照片路径
                 actor_node_to_use = Node("Actor", name=actor_name, photo_path="")  
-                graph.merge(actor_node_to_use, "Actor", "name")
+                timed_write("import_merge_actor", graph.merge, actor_node_to_use, "Actor", "name")
             # 建立演员出演电影的关系
             acted_rel = Relationship(actor_node_to_use, "ACTED_IN", movie_node)
-            graph.merge(acted_rel)
+            timed_write("import_merge_acted_in", graph.merge, acted_rel)
     
     # 处理导演
     if directors_str:
         director_names = [name.strip() for name in directors_str.split("、") if name.strip()]
         for director_name in director_names:
             # 先尝试匹配已存在的导演节点
-            director_node_existing = matcher.match("Director", name=director_name).first()
+            director_node_existing = match_one("import_match_director", "Director", name=director_name)
             if director_node_existing:
                 director_node_to_use = director_node_existing
             else:
                 director_node_to_use = Node("Director", name=director_name, photo_path="")
-                graph.merge(director_node_to_use, "Director", "name")
+                timed_write("import_merge_director", graph.merge, director_node_to_use, "Director", "name")
             # 建立导演执导电影关系
             directed_rel = Relationship(director_node_to_use, "DIRECTED", movie_node)
-            graph.merge(directed_rel)
+            timed_write("import_merge_directed", graph.merge, directed_rel)
   
             # 针对每个演员与该导演建立合作关系
             if actors_str:
                 for actor_name in actor_names:
-                    actor_node_existing = matcher.match("Actor", name=actor_name).first()
+                    actor_node_existing = match_one("import_match_actor", "Actor", name=actor_name)
                     if actor_node_existing:
                         coop_rel = Relationship(actor_node_existing, "COOPERATED_WITH", director_node_to_use)
-                        graph.merge(coop_rel)
+                        timed_write("import_merge_cooperated_with", graph.merge, coop_rel)
 
 def import_actors_from_csv(csv_file_path: str, actor_photo_folder="actor_photos"):
     with open(csv_file_path, encoding='utf-8-sig') as f:
@@ -247,7 +889,7 @@ def import_actors_from_csv(csv_file_path: str, actor_photo_folder="actor_photos"
             if name:
                 photo_path = str(Path(actor_photo_folder) / f"{idx}.jpg")
                 actor_node = Node("Actor", name=name, photo_path=photo_path)
-                graph.merge(actor_node, "Actor", "name")
+                timed_write("import_merge_actor", graph.merge, actor_node, "Actor", "name")
                 
 def import_directors_from_csv(csv_file_path: str, director_photo_folder="director_photos"):
     with open(csv_file_path, encoding='utf-8-sig') as f:
@@ -257,7 +899,7 @@ def import_directors_from_csv(csv_file_path: str, director_photo_folder="directo
             if name:
                 photo_path = str(Path(director_photo_folder) / f"{idx}.jpg")
                 director_node = Node("Director", name=name, photo_path=photo_path)
-                graph.merge(director_node, "Director", "name")
+                timed_write("import_merge_director", graph.merge, director_node, "Director", "name")
 
 # ============================= BASIC STRUCTURE =============================
 
@@ -312,7 +954,8 @@ class ActorDirectorList(BaseModel): # 演员合作过的导演
 async def create_actor(actor: Actor):
     try:
         actor_node = Node("Actor", **actor.model_dump())
-        graph.create(actor_node)
+        timed_write("create_actor", graph.create, actor_node)
+        await store_call(catalog_stats.add_person, "actors")
         logging.info(f"Actor created: {actor.name}")
         return actor
     except Exception as e:
@@ -321,32 +964,70 @@ async def create_actor(actor: Actor):
     
 @app.get("/actors/{name}", response_model=Actor)
 async def read_actor(name: str):
-    actor_node = matcher.match("Actor", name=name).first()
+    actor_node = match_one("read_actor", "Actor", name=name)
     if actor_node:
         return Actor(**dict(actor_node))
     raise HTTPException(status_code=404, detail="Actor not found")
 
 @app.get("/actors", response_model=List[Actor])
+@cached_response
 async def read_actors():
-    actors = matcher.match("Actor")
-    return [Actor(**dict(actor)) for actor in actors]
+    actors = await run_read_query("list_actors", "MATCH (a:Actor) RETURN a.name AS name, a.photo_path AS photo_path")
+    return fast_json(actors)
 
 @app.delete("/actors/{name}")
 async def delete_actor(name: str):
-    actor_node = matcher.match("Actor", name=name).first()
-    if actor_node:
-        graph.delete(actor_node)
-        logging.info(f"Actor deleted: {name}")
-        return {"message": f"Actor {name} deleted successfully"}
-    raise HTTPException(status_code=404, detail="Actor not found")
+    # 一条语句（一个事务）删除节点和它的所有边；COOPERATED_WITH 都以该演员为端点，随节点一起删掉。
+    # 同时返回各参演电影删除前的演员人数，用于增量更新统计
+    rows = run_query("delete_actor", """
+    MATCH (a:Actor {name: $name})
+    OPTIONAL MATCH (a)-[:ACTED_IN]->(m:Movie)
+    WITH a, [m IN collect(DISTINCT m) | size([(x:Actor)-[:ACTED_IN]->(m) | x])] AS cast_sizes
+    DETACH DELETE a
+    RETURN cast_sizes
+    """, name=name)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Actor not found")
+    for row in rows:
+        await store_call(catalog_stats.remove_person, "actors")
+        for cast_size in row["cast_sizes"]:
+            await store_call(catalog_stats.change_cast_size, cast_size, cast_size - 1)
+    logging.info(f"Actor deleted: {name}")
+    return {"message": f"Actor {name} deleted successfully"}
 
 # ============================= MOVIE APIS =============================
 
+# 在一个事务内删除电影及其边，并只重算这部电影涉及的演员-导演合作关系：
+# 若某对演员和导演除这部电影外没有其他共同作品，删掉他们的 COOPERATED_WITH。
+# 返回删除前的统计字段，用于增量更新统计
+DELETE_MOVIE_QUERY = """
+MATCH (m:Movie {title: $title})
+OPTIONAL MATCH (a:Actor)-[:ACTED_IN]->(m)
+WITH m, collect(DISTINCT a) AS actors
+OPTIONAL MATCH (d:Director)-[:DIRECTED]->(m)
+WITH m, actors, collect(DISTINCT d) AS directors
+WITH m, actors, directors, m.genres AS genres, m.release_date AS release_date
+DETACH DELETE m
+WITH genres, release_date, actors, directors
+CALL {
+    WITH actors, directors
+    UNWIND actors AS a
+    UNWIND directors AS d
+    MATCH (a)-[c:COOPERATED_WITH]->(d)
+    WHERE NOT EXISTS { MATCH (a)-[:ACTED_IN]->(:Movie)<-[:DIRECTED]-(d) }
+    DELETE c
+    RETURN count(*) AS stale_pairs
+}
+RETURN genres, release_date, size(actors) AS cast_size,
+       [a IN actors | a.name] AS actors, [d IN directors | d.name] AS directors, stale_pairs
+"""
+
 @app.post("/movies", response_model=Movie)
 async def create_movie(movie: Movie):
     try:
         movie_node = Node("Movie", **movie.model_dump())
-        graph.create(movie_node)
+        timed_write("create_movie", graph.create, movie_node)
+        await store_call(catalog_stats.add_movie, movie.genres, movie.release_date)
         logging.info(f"Movie created: {movie.title}")
         return movie
     except Exception as e:
@@ -355,7 +1036,7 @@ async def create_movie(movie: Movie):
 
 @app.get("/movies/{title}", response_model=Movie)
 async def read_movie(title: str):
-    movie_node = matcher.match("Movie", title=title).first()
+    movie_node = match_one("read_movie", "Movie", title=title)
     if movie_node:
         data = dict(movie_node)
         if isinstance(data.get("genres"), str):
@@ -364,24 +1045,30 @@ async def read_movie(title: str):
     raise HTTPException(status_code=404, detail="Movie not found")
 
 @app.get("/movies", response_model=List[Movie])
+@cached_response
 async def read_movies():
-    movies = matcher.match("Movie")
+    movies = await run_read_query("list_movies", f"MATCH (m:Movie) RETURN m {MOVIE_PROJECTION} AS movie")
     result = []
-    for movie in movies:
-        data = dict(movie)
+    for row in movies:
+        data = dict(row["movie"])  # 行是 single-flight 共享的，复制后再改
         if isinstance(data.get("genres"), str):
             data["genres"] = [data["genres"]]
-        result.append(Movie(**data))
-    return result
+        result.append(data)
+    return fast_json(result)
 
 @app.delete("/movies/{title}")
 async def delete_movie(title: str):
-    movie_node = matcher.match("Movie", title=title).first()
-    if movie_node:
-        graph.delete(movie_node)
-        logging.info(f"Movie deleted: {title}")
-        return {"message": f"Movie {title} deleted successfully"}
-    raise HTTPException(status_code=404, detail="Movie not found")
+    rows = run_query("delete_movie", DELETE_MOVIE_QUERY, title=title)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Movie not found")
+    for row in rows:
+        await store_call(catalog_stats.remove_movie, row["genres"], row["release_date"], row["cast_size"],
+                         row["directors"])
+        # 演员/导演可能因此不再关联任何电影，交给后台清理检查
+        await store_call(queue_orphan_candidates, "actors", row["actors"])
+        await store_call(queue_orphan_candidates, "directors", row["directors"])
+    logging.info(f"Movie deleted: {title} ({sum(row['stale_pairs'] for row in rows)} collaboration pairs removed)")
+    return {"message": f"Movie {title} deleted successfully"}
 
 # ============================= DIRECTOR APIS =============================
 
@@ -390,7 +1077,8 @@ async def create_director(director: Director):
     try:
         # 使用 model_dump() 将 Pydantic 对象转换为字典，并创建一个 "Director" 标签的节点
         director_node = Node("Director", **director.model_dump())
-        graph.create(director_node)
+        timed_write("create_director", graph.create, director_node)
+        await store_call(catalog_stats.add_person, "directors")
         logging.info(f"Director created: {director.name}")
         return director
     except Exception as e:
@@ -399,42 +1087,63 @@ async def create_director(director: Director):
 
 @app.get("/directors/{name}", response_model=Director)
 async def read_director(name: str):
-    director_node = matcher.match("Director", name=name).first()
+    director_node = match_one("read_director", "Director", name=name)
     if director_node:
         return Director(**dict(director_node))
     raise HTTPException(status_code=404, detail="Director not found")
 
 @app.get("/directors", response_model=List[Director])
+@cached_response
 async def read_directors():
-    directors = matcher.match("Director")
-    return [Director(**dict(director)) for director in directors]
+    directors = await run_read_query("list_directors", "MATCH (d:Director) RETURN d.name AS name, d.photo_path AS photo_path")
+    return fast_json(directors)
 
 @app.delete("/directors/{name}")
 async def delete_director(name: str):
-    director_node = matcher.match("Director", name=name).first()
-    if director_node:
-        graph.delete(director_node)
-        logging.info(f"Director deleted: {name}")
-        return {"message": f"Director {name} deleted successfully"}
-    raise HTTPException(status_code=404, detail="Director not found")
+    # 与删除演员相同：COOPERATED_WITH 都以该导演为端点，一个事务内随节点删掉
+    deleted = run_query("delete_director", """
+    MATCH (d:Director {name: $name})
+    DETACH DELETE d
+    RETURN count(*) AS n
+    """, name=name)[0]["n"]
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Director not found")
+    await store_call(catalog_stats.remove_director, name, deleted)
+    logging.info(f"Director deleted: {name}")
+    return {"message": f"Director {name} deleted successfully"}
 
 # ============================= RELATIONSHIP APIS =============================
 
 # 1.电影-演员关系
 
+# 建边和读取统计需要的信息在同一条语句（同一个事务）里完成。先写一次电影节点的属性拿到它的写锁
+# （持有到提交），同一部电影的并发建边因此依次执行：MERGE 不会重复建边，之后数到的人数也包含
+# 此前已提交的边。ON CREATE 的标记区分新建和已存在的边，两个临时属性在同一事务内删掉
+ACTOR_IN_MOVIE_QUERY = """
+MATCH (a:Actor {name: $name}) WITH a LIMIT 1
+MATCH (m:Movie {title: $title}) WITH a, m LIMIT 1
+SET m.__lock = true
+MERGE (a)-[r:ACTED_IN]->(m)
+ON CREATE SET r.__created = true
+WITH m, r, r.__created IS NOT NULL AS created
+REMOVE r.__created, m.__lock
+WITH m, created
+MATCH (x:Actor)-[:ACTED_IN]->(m)
+RETURN created, count(x) AS cast_size
+"""
+
 @app.post("/actor_in_movie")
 async def add_actor_to_movie(relation: ActorInMovie): # 添加电影-演员关系
     try:
-        actor_node = matcher.match("Actor", name=relation.actor_name).first()
-        movie_node = matcher.match("Movie", title=relation.movie_title).first()
-        
-        if not actor_node:
-            raise HTTPException(status_code=404, detail="Actor not found")
-        if not movie_node:
+        rows = run_query("actor_in_movie", ACTOR_IN_MOVIE_QUERY, name=relation.actor_name, title=relation.movie_title)
+        if not rows:
+            # 只在出错时多查一次，区分是哪一端不存在
+            if not match_one("actor_in_movie_actor", "Actor", name=relation.actor_name):
+                raise HTTPException(status_code=404, detail="Actor not found")
             raise HTTPException(status_code=404, detail="Movie not found")
-        
-        acted_in = Relationship(actor_node, "ACTED_IN", movie_node)
-        graph.merge(acted_in)
+        if rows[0]["created"]:
+            cast_size = rows[0]["cast_size"]
+            await store_call(catalog_stats.change_cast_size, cast_size - 1, cast_size)
         
         logging.info(f"Relationship added: {relation.actor_name} ACTED_IN {relation.movie_title}")
         return {"message": f"Relationship added: {relation.actor_name} ACTED_IN {relation.movie_title}"}
@@ -443,16 +1152,17 @@ async def add_actor_to_movie(relation: ActorInMovie): # 添加电影-演员关
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.get("/actors/{name}/filmography", response_model=Optional[ActorFilmography])
+@cached_response
 async def get_actor_filmography(name: str): # 获取演员影史
-    cypher_query = """
-    MATCH (a:Actor {name: $name})-[:ACTED_IN]->(m:Movie)
+    cypher_query = f"""
+    MATCH (a:Actor {{name: $name}})-[:ACTED_IN]->(m:Movie)
     WITH a as actor, m
     ORDER BY COALESCE(m.release_date, '') DESC, m.title
-    WITH actor, collect(m) as movies
-    RETURN actor, movies
+    WITH actor, collect(m {MOVIE_PROJECTION}) as movies
+    RETURN actor {PERSON_PROJECTION} as actor, movies
     """
     
-    result = graph.run(cypher_query, name=name).data()
+    result = await run_read_query("actor_filmography", cypher_query, name=name)
     
     if not result or not result[0]['actor']:
         return None
@@ -460,7 +1170,7 @@ async def get_actor_filmography(name: str): # 获取演员影史
     actor_data = result[0]['actor']
     movies_data = result[0]['movies']
     
-    return {
+    return fast_json({
         "actor": {
             "name": actor_data["name"],
             "photo_path": actor_data.get("photo_path")
@@ -469,39 +1179,40 @@ async def get_actor_filmography(name: str): # 获取演员影史
             {
                 "title": movie["title"],
                 "english_title": movie.get("english_title"),
-                "genres": [g.strip() for g in movie["genres"].split(",")] if movie.get("genres") else [],
+                "genres": split_genres(movie.get("genres")),
                 "release_date": movie.get("release_date"),
                 "cover_path": movie.get("cover_path")
             } for movie in movies_data
         ]
-    }
+    })
 
 @app.get("/movies/{title}/cast")
+@cached_response
 async def get_movie_cast(title: str): #获取电影演员阵容
-    cypher_query = """
-    MATCH (m:Movie {title: $title})
+    cypher_query = f"""
+    MATCH (m:Movie {{title: $title}})
     OPTIONAL MATCH (a:Actor)-[:ACTED_IN]->(m)
     WITH m as movie, collect(a) as unsorted_actors
-    WITH movie, [actor in unsorted_actors | actor {.*}] as actors_data
-    RETURN movie, apoc.coll.sort(actors_data, '^.name') as actors
+    WITH movie, [actor in unsorted_actors | actor {PERSON_PROJECTION}] as actors_data
+    RETURN movie {MOVIE_PROJECTION} as movie, apoc.coll.sort(actors_data, '^.name') as actors
     """
     
     # If you don't have APOC installed, use this simpler query instead:
-    alternative_query = """
-    MATCH (m:Movie {title: $title})
+    alternative_query = f"""
+    MATCH (m:Movie {{title: $title}})
     OPTIONAL MATCH (a:Actor)-[:ACTED_IN]->(m)
     WITH m as movie, a
     ORDER BY a.name
-    WITH movie, collect(a) as actors
-    RETURN movie, actors
+    WITH movie, collect(a {PERSON_PROJECTION}) as actors
+    RETURN movie {MOVIE_PROJECTION} as movie, actors
     """
     
     try:
         # Try with APOC first
-        result = graph.run(cypher_query, title=title).data()
+        result = await run_read_query("movie_cast", cypher_query, title=title)
     except Exception:
         # Fall back to alternative query if APOC is not available
-        result = graph.run(alternative_query, title=title).data()
+        result = await run_read_query("movie_cast_fallback", alternative_query, title=title)
     
     if not result or not result[0]['movie']:
         raise HTTPException(status_code=404, detail="Movie not found")
@@ -509,11 +1220,11 @@ async def get_movie_cast(title: str): #获取电影演员阵容
     movie_data = result[0]['movie']
     actors_data = result[0]['actors']
     
-    return {
+    return fast_json({
         "movie": {
             "title": movie_data["title"],
             "english_title": movie_data.get("english_title"),
-            "genres": [g.strip() for g in movie_data["genres"].split(",")] if movie_data.get("genres") else [],
+            "genres": split_genres(movie_data.get("genres")),
             "release_date": movie_data.get("release_date"),
             "cover_path": movie_data.get("cover_path")
         },
@@ -523,26 +1234,33 @@ async def get_movie_cast(title: str): #获取电影演员阵容
                 "photo_path": actor.get("photo_path")
             } for actor in actors_data if actor  # Filter out None values
         ]
-    }
+    })
 
 # 2.电影-导演关系
 
+# 与 ACTOR_IN_MOVIE_QUERY 相同：一条语句建立导演执导电影的关系，并返回这条边是否为新建
+DIRECTOR_IN_MOVIE_QUERY = """
+MATCH (d:Director {name: $name}) WITH d LIMIT 1
+MATCH (m:Movie {title: $title}) WITH d, m LIMIT 1
+SET m.__lock = true
+MERGE (d)-[r:DIRECTED]->(m)
+ON CREATE SET r.__created = true
+WITH m, r, r.__created IS NOT NULL AS created
+REMOVE r.__created, m.__lock
+RETURN created
+"""
+
 @app.post("/director_in_movie")
 async def add_director_to_movie(relation: DirectorInMovie):
     try:
-        # 查询导演节点（根据导演姓名）
-        director_node = matcher.match("Director", name=relation.director_name).first()
-        # 查询电影节点（根据电影标题）
-        movie_node = matcher.match("Movie", title=relation.movie_title).first()
-        
-        if not director_node:
-            raise HTTPException(status_code=404, detail="Director not found")
-        if not movie_node:
+        rows = run_query("director_in_movie", DIRECTOR_IN_MOVIE_QUERY,
+                         name=relation.director_name, title=relation.movie_title)
+        if not rows:
+            if not match_one("director_in_movie_director", "Director", name=relation.director_name):
+                raise HTTPException(status_code=404, detail="Director not found")
             raise HTTPException(status_code=404, detail="Movie not found")
-        
-        # 建立导演执导电影的关系，关系类型为 "DIRECTED"
-        directed_rel = Relationship(director_node, "DIRECTED", movie_node)
-        graph.merge(directed_rel)
+        if rows[0]["created"]:
+            await store_call(catalog_stats.add_directed, relation.director_name)
         
         logging.info(f"Relationship added: {relation.director_name} DIRECTED {relation.movie_title}")
         return {"message": f"Relationship added: {relation.director_name} DIRECTED {relation.movie_title}"}
@@ -551,16 +1269,17 @@ async def add_director_to_movie(relation: DirectorInMovie):
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.get("/directors/{name}/filmography", response_model=Optional[DirectorFilmography])
+@cached_response
 async def get_director_filmography(name: str): # 查询导演影史
-    cypher_query = """
-    MATCH (d:Director {name: $name})-[:DIRECTED]->(m:Movie)
+    cypher_query = f"""
+    MATCH (d:Director {{name: $name}})-[:DIRECTED]->(m:Movie)
     WITH d as director, m
     ORDER BY COALESCE(m.release_date, '') DESC, m.title
-    WITH director, collect(m) as movies
-    RETURN director, movies
+    WITH director, collect(m {MOVIE_PROJECTION}) as movies
+    RETURN director {PERSON_PROJECTION} as director, movies
     """
     
-    result = graph.run(cypher_query, name=name).data()
+    result = await run_read_query("director_filmography", cypher_query, name=name)
     
     if not result or not result[0]['director']:
         return None
@@ -568,7 +1287,7 @@ async def get_director_filmography(name: str): # 查询导演影史
     director_data = result[0]['director']
     movies_data = result[0]['movies']
     
-    return {
+    return fast_json({
         "director": {
             "name": director_data["name"],
             "photo_path": director_data.get("photo_path")
@@ -577,23 +1296,24 @@ async def get_director_filmography(name: str): # 查询导演影史
             {
                 "title": movie["title"],
                 "english_title": movie.get("english_title"),
-                "genres": [g.strip() for g in movie["genres"].split(",")] if movie.get("genres") else [],
+                "genres": split_genres(movie.get("genres")),
                 "release_date": movie.get("release_date"),
                 "cover_path": movie.get("cover_path")
             } for movie in movies_data
         ]
-    }
+    })
 
 @app.get("/movies/{title}/directors")
+@cached_response
 async def get_movie_directors(title: str): #查询电影的导演阵容
-    cypher_query = """
-    MATCH (m:Movie {title: $title})
+    cypher_query = f"""
+    MATCH (m:Movie {{title: $title}})
     OPTIONAL MATCH (d:Director)-[:DIRECTED]->(m)
-    WITH m as movie, collect(d) as directors
-    RETURN movie, directors
+    WITH m as movie, collect(d {PERSON_PROJECTION}) as directors
+    RETURN movie {MOVIE_PROJECTION} as movie, directors
     """
     
-    result = graph.run(cypher_query, title=title).data()
+    result = await run_read_query("movie_directors", cypher_query, title=title)
     
     if not result or not result[0]['movie']:
         raise HTTPException(status_code=404, detail="Movie not found")
@@ -601,11 +1321,11 @@ async def get_movie_directors(title: str): #查询电影的导演阵容
     movie_data = result[0]['movie']
     directors_data = result[0]['directors']
     
-    return {
+    return fast_json({
         "movie": {
             "title": movie_data["title"],
             "english_title": movie_data.get("english_title"),
-            "genres": [g.strip() for g in movie_data["genres"].split(",")] if movie_data.get("genres") else [],
+            "genres": split_genres(movie_data.get("genres")),
             "release_date": movie_data.get("release_date"),
             "cover_path": movie_data.get("cover_path")
         },
@@ -615,18 +1335,19 @@ async def get_movie_directors(title: str): #查询电影的导演阵容
                 "photo_path": director.get("photo_path")
             } for director in directors_data if director  # 过滤掉 None 值
         ]
-    }
+    })
 
 # 3.导演-演员关系
 
 @app.get("/directors/{name}/actors", response_model=DirectorActorList)
+@cached_response
 async def get_director_actors(name: str):  # 查询某导演直接合作过的演员列表
-    cypher_query = """
-    MATCH (a:Actor)-[:COOPERATED_WITH]->(d:Director {name: $name})
-    RETURN d as director, collect(DISTINCT a) as actors
+    cypher_query = f"""
+    MATCH (a:Actor)-[:COOPERATED_WITH]->(d:Director {{name: $name}})
+    RETURN d {PERSON_PROJECTION} as director, collect(DISTINCT a {PERSON_PROJECTION}) as actors
     """
     
-    result = graph.run(cypher_query, name=name).data()
+    result = await run_read_query("director_actors", cypher_query, name=name)
     
     if not result or not result[0].get('director'):
         raise HTTPException(status_code=404, detail="Director not found")
@@ -634,7 +1355,7 @@ async def get_director_actors(name: str):  # 查询某导演直接合作过的
     director_data = result[0]['director']
     actors_data = result[0]['actors']
     
-    return {
+    return fast_json({
         "director": {
             "name": director_data["name"],
             "photo_path": director_data.get("photo_path")
@@ -645,15 +1366,16 @@ async def get_director_actors(name: str):  # 查询某导演直接合作过的
                 "photo_path": actor.get("photo_path")
             } for actor in actors_data if actor is not None
         ]
-    }
+    })
 
 @app.get("/actors/{name}/directors", response_model=ActorDirectorList)
+@cached_response
 async def get_actor_directors(name: str):  # 查询某演员直接合作过的导演列表
-    cypher_query = """
-    MATCH (a:Actor {name: $name})-[:COOPERATED_WITH]->(d:Director)
-    RETURN a as actor, collect(DISTINCT d) as directors
+    cypher_query = f"""
+    MATCH (a:Actor {{name: $name}})-[:COOPERATED_WITH]->(d:Director)
+    RETURN a {PERSON_PROJECTION} as actor, collect(DISTINCT d {PERSON_PROJECTION}) as directors
     """
-    result = graph.run(cypher_query, name=name).data()
+    result = await run_read_query("actor_directors", cypher_query, name=name)
     
     if not result or not result[0].get('actor'):
         raise HTTPException(status_code=404, detail="Actor not found")
@@ -661,7 +1383,7 @@ async def get_actor_directors(name: str):  # 查询某演员直接合作过的
     actor_data = result[0]['actor']
     directors_data = result[0]['directors']
     
-    return {
+    return fast_json({
         "actor": {
             "name": actor_data.get("name"),
             "photo_path": actor_data.get("photo_path")
@@ -672,11 +1394,12 @@ async def get_actor_directors(name: str):  # 查询某演员直接合作过的
                 "photo_path": director.get("photo_path")
             } for director in directors_data if director is not None
         ]
-    }
+    })
 
 # ============================= SEARCH APIS =============================
 
 @app.get("/autocomplete/{search_type}")
+@cached_response
 async def autocomplete(search_type: str, query: str = Query(..., min_length=1)):
     if search_type not in ['actor', 'movie']:
         raise HTTPException(status_code=400, detail="Invalid search type")
@@ -703,17 +1426,18 @@ async def autocomplete(search_type: str, query: str = Query(..., min_length=1)):
     """
     
     try:
-        results = graph.run(cypher_query, query=query).data()
+        results = await run_read_query(f"autocomplete_{search_type}", cypher_query, query=query)
         
         # Format results
         suggestions = [result['name'] for result in results]
-        return suggestions
+        return fast_json(suggestions)
         
     except Exception as e:
         logging.error(f"Error in autocomplete: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
     
 @app.get("/search/{search_type}")
+@cached_response
 async def search(search_type: str, query: str = Query(..., min_length=1)):
     if search_type not in ['actor', 'movie', 'director']:
         raise HTTPException(status_code=400, detail="Invalid search type")
@@ -738,19 +1462,428 @@ async def search(search_type: str, query: str = Query(..., min_length=1)):
     """
     
     try:
-        results = graph.run(cypher_query, query=query).data()
-        return [dict(result['n']) for result in results]
+        results = await run_read_query(f"search_{search_type}", cypher_query, query=query)
+        return fast_json([dict(result['n']) for result in results])
     except Exception as e:
         logging.error(f"Error in search: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
     
+# ============================= CATALOG STATS =============================
+
+STATS_TOP_DIRECTORS = int(os.getenv("STATS_TOP_DIRECTORS", 20))
+
+# 重建时每部电影需要的统计字段（删除电影时由 DELETE_MOVIE_QUERY 返回同样的字段）
+ALL_MOVIE_STATS_QUERY = """
+    MATCH (m:Movie)
+    OPTIONAL MATCH (a:Actor)-[:ACTED_IN]->(m)
+    WITH m, count(a) AS cast_size
+    OPTIONAL MATCH (d:Director)-[:DIRECTED]->(m)
+    WITH m, cast_size, collect(d.name) AS directors
+    RETURN m.title AS title, m.genres AS genres, m.release_date AS release_date, cast_size, directors
+"""
+
+def _genre_list(genres):
+    # API 创建的电影 genres 是列表，CSV 导入的是逗号分隔字符串
+    if isinstance(genres, list):
+        return [g.strip() for g in genres if g and g.strip()]
+    return split_genres(genres) if genres else []
+
+def _release_year(release_date):
+    year = (release_date or "")[:4]
+    return year if year.isdigit() else "unknown"
+
+STATS_COUNTERS = ("totals", "genres", "years", "directors", "cast_sizes")
+
+class CatalogStats:
+    # 物化的目录统计：导入后整体重建一次，之后由写接口增量维护，/stats 直接读快照。
+    # 计数放在共享存储里，多 worker 时所有进程看到同一份、增量更新也是原子的
+    def __init__(self, store):
+        self.store = store
+        # 增量更新没写进共享存储时置位：统计已不可信，下次检查 built 时标记为需要重建
+        self.needs_rebuild = False
+
+    @property
+    def built(self):
+        if self.needs_rebuild:
+            self.store.execute({"op": "delete", "key": "stats:computed_at"})
+            self.needs_rebuild = False
+        return self.store.execute({"op": "get", "key": "stats:computed_at"})[0] is not None
+
+    def _changed_ops(self):
+        # 任何变化都让版本号加一，并使缓存的快照失效
+        return [{"op": "set", "key": "stats:updated_at", "value": datetime.utcnow().isoformat()},
+                {"op": "hincr", "key": "stats:meta", "field": "version", "delta": 1},
+                {"op": "delete", "key": "stats:snapshot"}]
+
+    def _apply(self, ops):
+        # 调用时 Neo4j 写入已经提交，统计更新失败不能让请求失败；记下来，之后整体重建
+        try:
+            self.store.execute(*ops, *self._changed_ops())
+        except Exception as e:
+            self.needs_rebuild = True
+            metrics.observe_cache_error("stats")
+            logging.error(f"Catalog stats update failed, will rebuild: {str(e)}")
+
+    def _incr(self, changes):
+        self._apply([{"op": "hincr", "key": f"stats:{counter}", "field": str(field), "delta": delta}
+                     for counter, field, delta in changes])
+
+    def reset(self):
+        self.rebuild([], 0, 0)
+
+    def rebuild(self, movie_rows, actor_count, director_count):
+        counters = {name: Counter() for name in STATS_COUNTERS}
+        for row in movie_rows:
+            for counter, field, delta in self._movie_changes(row["genres"], row["release_date"],
+                                                             row["cast_size"], row["directors"], 1):
+                counters[counter][str(field)] += delta
+        counters["totals"]["actors"] = actor_count
+        counters["totals"]["directors"] = director_count
+        ops = [{"op": "hreplace", "key": f"stats:{name}", "mapping": {k: v for k, v in counter.items() if v > 0}}
+               for name, counter in counters.items()]
+        ops.append({"op": "set", "key": "stats:computed_at", "value": datetime.utcnow().isoformat()})
+        self.store.execute(*ops, *self._changed_ops())
+        self.needs_rebuild = False
+
+    @staticmethod
+    def _movie_changes(genres, release_date, cast_size, directors, delta):
+        changes = [("totals", "movies", delta), ("years", _release_year(release_date), delta),
+                   ("cast_sizes", cast_size, delta)]
+        changes += [("genres", genre, delta) for genre in _genre_list(genres)]
+        changes += [("directors", name, delta) for name in directors if name]
+        return changes
+
+    def add_movie(self, genres, release_date):
+        self._incr(self._movie_changes(genres, release_date, 0, (), 1))
+
+    def remove_movie(self, genres, release_date, cast_size, directors):
+        self._incr(self._movie_changes(genres, release_date, cast_size, directors, -1))
+
+    def change_cast_size(self, old_size, new_size):
+        self._incr([("cast_sizes", old_size, -1), ("cast_sizes", new_size, 1)])
+
+    def add_person(self, kind):
+        self._incr([("totals", kind, 1)])
+
+    def remove_person(self, kind, count=1):
+        self._incr([("totals", kind, -count)])
+
+    def add_directed(self, director_name):
+        self._incr([("directors", director_name, 1)])
+
+    def remove_director(self, director_name, count=1):
+        # POST /directors 不查重，同名导演可能有多个，按实际删除的个数扣减
+        self._apply([{"op": "hdel", "key": "stats:directors", "field": director_name},
+                     {"op": "hincr", "key": "stats:totals", "field": "directors", "delta": -count}])
+
+    def snapshot_body(self):
+        """Return the /stats payload as encoded JSON, computed once per change."""
+        snapshot, meta = self.store.execute({"op": "get", "key": "stats:snapshot"},
+                                            {"op": "hgetall", "key": "stats:meta"})
+        # 快照带着计算时的版本号；版本已变的（算的过程中又有更新）不用
+        if snapshot is not None and snapshot["version"] == meta.get("version", 0):
+            return snapshot["body"].encode("utf-8")
+        # 计数、时间和版本号在同一批操作里读出，彼此一致
+        results = self.store.execute(*({"op": "hgetall", "key": f"stats:{name}"} for name in STATS_COUNTERS),
+                                     {"op": "get", "key": "stats:computed_at"},
+                                     {"op": "get", "key": "stats:updated_at"},
+                                     {"op": "hgetall", "key": "stats:meta"})
+        totals, genres, years, directors, cast_sizes = (Counter(r) for r in results[:5])
+        version = results[7].get("version", 0)
+        body = _dumps({
+            "totals": {k: totals[k] for k in ("movies", "actors", "directors")},
+            "genres": dict(genres.most_common()),
+            "movies_per_year": dict(sorted(years.items())),
+            "top_directors": [{"name": name, "movies": count}
+                              for name, count in directors.most_common(STATS_TOP_DIRECTORS)],
+            "cast_size_distribution": {size: count for size, count in
+                                       sorted(cast_sizes.items(), key=lambda item: int(item[0]))},
+            "computed_at": results[5],
+            "updated_at": results[6],
+        }).decode("utf-8")
+        # 只有版本号仍未变化时才写入，避免并发更新之后把旧快照放回去
+        self.store.execute({"op": "set", "key": "stats:snapshot", "value": {"version": version, "body": body},
+                            "expect": ["stats:meta", "version", version]})
+        return body.encode("utf-8")
+
+catalog_stats = CatalogStats(shared_store)
+
+def rebuild_stats():
+    # 全图聚合本来就慢，租约保证只跑一次，不能再被慢查询日志 PROFILE 一遍（/stats 触发时也有路由）
+    movie_rows = run_query("stats_rebuild_movies", ALL_MOVIE_STATS_QUERY, profile=False)
+    actor_count = run_query("stats_rebuild_actors", "MATCH (a:Actor) RETURN count(a) AS n", profile=False)[0]["n"]
+    director_count = run_query("stats_rebuild_directors", "MATCH (d:Director) RETURN count(d) AS n",
+                               profile=False)[0]["n"]
+    catalog_stats.rebuild(movie_rows, actor_count, director_count)
+    logging.info(f"Catalog stats rebuilt: {len(movie_rows)} movies")
+
+STATS_REBUILD_LEASE = 300  # 秒；持有租约的进程中途退出时，过期后由其他进程接手
+
+def ensure_stats_built():
+    # 多 worker 同时启动（或统计被标记为需要重建）时，只有拿到租约的进程扫描全图，其余进程等它写完
+    while not catalog_stats.built:
+        lease = {"op": "add", "key": "stats:rebuild_lease", "value": os.getpid(), "ttl": STATS_REBUILD_LEASE}
+        if shared_store.execute(lease)[0]:
+            try:
+                rebuild_stats()
+            finally:
+                shared_store.execute({"op": "delete", "key": "stats:rebuild_lease"})
+            return
+        time.sleep(0.5)
+
+@app.get("/stats")
+async def read_stats():
+    # 正常情况下只读缓存的快照；共享存储里还没有统计时才扫描一次
+    try:
+        await run_in_threadpool(ensure_stats_built)
+        body = await store_call(catalog_stats.snapshot_body)
+    except CacheError as e:
+        metrics.observe_cache_error("stats")
+        raise HTTPException(status_code=503, detail=f"Shared cache unavailable: {str(e)}")
+    return Response(content=body, media_type="application/json")
+
+# ============================= ORPHAN SWEEPER =============================
+
+ORPHAN_SWEEP_INTERVAL = float(os.getenv("ORPHAN_SWEEP_INTERVAL", 60))  # 秒，0 关闭
+ORPHAN_SWEEP_BATCH = int(os.getenv("ORPHAN_SWEEP_BATCH", 500))
+
+ORPHAN_KINDS = {"actors": ("Actor", "ACTED_IN"), "directors": ("Director", "DIRECTED")}
+
+# 按导演名滚动检查一批导演的 COOPERATED_WITH，删掉已没有共同作品的；走 director_name_index，
+# 每次只碰一批，扫到末尾时 last 为 null。只用于修复删除电影会顺带清理合作关系之前遗留的边，
+# 新产生的失效边已由 DELETE_MOVIE_QUERY 在同一事务里删除，所以完整扫完一轮没有删掉任何边后就不再扫描
+STALE_COOPERATION_QUERY = """
+MATCH (d:Director) WHERE d.name > $after
+WITH d ORDER BY d.name LIMIT $batch
+WITH collect(d) AS directors, max(d.name) AS last
+CALL {
+    WITH directors
+    UNWIND directors AS d
+    MATCH (a:Actor)-[c:COOPERATED_WITH]->(d)
+    WHERE NOT EXISTS { MATCH (a)-[:ACTED_IN]->(:Movie)<-[:DIRECTED]-(d) }
+    DELETE c
+    RETURN count(*) AS removed
+}
+RETURN last, removed
+"""
+
+def queue_orphan_candidates(kind, names):
+    # 只有删除电影会让人失去最后一条边；候选放在共享存储里，任一 worker 的清理任务都能处理。
+    # 刚通过 POST 创建、还没关联电影的人不在候选里，不会被误删
+    ops = [{"op": "hincr", "key": f"sweep:{kind}", "field": name, "delta": 1} for name in names if name]
+    if not ops:
+        return
+    try:
+        shared_store.execute(*ops)
+    except Exception as e:
+        # 删除已经提交，不能因此报错；漏掉的候选只是不会被自动清理
+        metrics.observe_cache_error("sweep_queue")
+        logging.error(f"Could not queue orphan candidates {names}: {str(e)}")
+
+def sweep_orphans(kind):
+    label, rel_type = ORPHAN_KINDS[kind]
+    candidates = list(shared_store.execute({"op": "hgetall", "key": f"sweep:{kind}"})[0])[:ORPHAN_SWEEP_BATCH]
+    if not candidates:
+        return 0
+    # 执行时再确认一次：候选入队后又被关联到其他电影的不删
+    removed = run_query(f"sweep_orphan_{kind}", f"""
+    UNWIND $names AS name
+    MATCH (p:{label} {{name: name}})
+    WHERE NOT EXISTS {{ MATCH (p)-[:{rel_type}]->(:Movie) }}
+    DETACH DELETE p
+    RETURN count(*) AS removed
+    """, names=candidates)[0]["removed"]
+    shared_store.execute(*({"op": "hdel", "key": f"sweep:{kind}", "field": name} for name in candidates))
+    if removed:
+        catalog_stats.remove_person(kind, removed)
+    return removed
+
+def sweep_stale_cooperation():
+    after, repaired = shared_store.execute({"op": "get", "key": "sweep:cursor"},
+                                           {"op": "get", "key": "sweep:cooperation_repaired"})
+    if repaired:
+        return 0
+    row = run_query("sweep_stale_cooperation", STALE_COOPERATION_QUERY, after=after or "", batch=ORPHAN_SWEEP_BATCH)[0]
+    # 游标和本轮累计删除数放在共享存储里，换了执行的 worker 也能接着扫
+    pass_removed = shared_store.execute(
+        {"op": "set", "key": "sweep:cursor", "value": row["last"] or ""},
+        {"op": "hincr", "key": "sweep:cooperation", "field": "removed", "delta": row["removed"]})[1]
+    if row["last"] is None:
+        # 一轮扫完：整轮没有删掉任何边说明旧数据已经修复完，记下来以后跳过；否则清零再扫一轮
+        done = [{"op": "set", "key": "sweep:cooperation_repaired", "value": True}] if not pass_removed else []
+        shared_store.execute(*done, {"op": "hreplace", "key": "sweep:cooperation", "mapping": {}})
+        if not pass_removed:
+            logging.info("Stale COOPERATED_WITH repair finished")
+    return row["removed"]
+
+def sweep_once():
+    # 每一步都是一个独立的、大小受 ORPHAN_SWEEP_BATCH 限制的事务
+    removed = {kind: sweep_orphans(kind) for kind in ORPHAN_KINDS}
+    removed["cooperation"] = sweep_stale_cooperation()
+    for kind, count in removed.items():
+        metrics.observe_sweep(kind, count)
+    if any(removed.values()):
+        response_cache.invalidate()  # 不经过写接口的修改，需要自己让缓存失效
+        logging.info(f"Orphan sweep removed {removed}")
+    return removed
+
+async def run_sweeper():
+    while True:
+        await asyncio.sleep(ORPHAN_SWEEP_INTERVAL)
+        try:
+            # 多 worker 时每个周期只有拿到租约的进程执行
+            lease = {"op": "add", "key": "sweep:lease", "value": os.getpid(), "ttl": ORPHAN_SWEEP_INTERVAL * 0.9}
+            if (await store_call(shared_store.execute, lease))[0]:
+                await run_in_threadpool(sweep_once)
+        except Exception as e:
+            logging.warning(f"Orphan sweep failed: {str(e)}")
+
+# ============================= WORKER METRICS =============================
+
+# 多 worker 时 metrics 和 slow_queries 都是进程内的：每个 worker 定期把自己的累计值整体写进共享存储，
+# /metrics 和 /debug/slow-queries 不论打到哪个 worker 都返回所有 worker 的合计。
+# 退出的 worker 最后一份快照保留在存储里，合计值不会因为 worker 重启而回退
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", 5))
+
+def publish_worker_metrics():
+    pid = str(os.getpid())
+    snapshot = {
+        "published_at": time.time(),
+        "metrics": metrics.snapshot(),
+        "slow_queries": slow_queries.snapshot(limit=SLOW_QUERY_LOG_SIZE),
+    }
+    # 每次都登记 pid：缓存服务重启丢了登记也能自己恢复
+    shared_store.execute({"op": "set", "key": f"metrics:worker:{pid}", "value": snapshot},
+                         {"op": "hincr", "key": "metrics:workers", "field": pid, "delta": 1})
+
+def worker_snapshots():
+    # 先发布自己的，保证本 worker 的数据是最新的；其他 worker 最多滞后 METRICS_PUBLISH_INTERVAL
+    publish_worker_metrics()
+    pids = list(shared_store.execute({"op": "hgetall", "key": "metrics:workers"})[0])
+    snapshots = shared_store.execute(*({"op": "get", "key": f"metrics:worker:{pid}"} for pid in pids))
+    return {pid: snapshot for pid, snapshot in zip(pids, snapshots) if snapshot is not None}
+
+def render_worker_metrics():
+    # 计数器和直方图跨所有（包括已退出的）worker 相加；in_flight 是瞬时值，只算还在发布的 worker
+    stale_before = time.time() - 3 * METRICS_PUBLISH_INTERVAL
+    return render_metrics([
+        snapshot["metrics"] if snapshot["published_at"] >= stale_before else {**snapshot["metrics"], "in_flight": 0}
+        for snapshot in worker_snapshots().values()
+    ])
+
+def worker_slow_queries(query=None, limit=50):
+    entries = [{**entry, "worker": int(pid)}
+               for pid, snapshot in worker_snapshots().items() for entry in snapshot["slow_queries"]]
+    if query:
+        entries = [e for e in entries if e["query"] == query]
+    entries.sort(key=lambda e: e["timestamp"], reverse=True)  # 最新的在前
+    return entries[:limit]
+
+async def run_metrics_publisher():
+    while True:
+        await asyncio.sleep(METRICS_PUBLISH_INTERVAL)
+        try:
+            await store_call(publish_worker_metrics)
+        except Exception as e:
+            logging.warning(f"Publishing worker metrics failed: {str(e)}")
+
+# ============================= LIFECYCLE =============================
+
+# 启动状态，供 /health/ready 使用
+service_state = {"neo4j": "connecting", "ready": False, "warmup_seconds": None, "last_error": None}
+
+async def retry_with_backoff(step_name, func, *args):
+    # 启动的每一步失败都按同样的指数退避重试；NEO4J_CONNECT_RETRIES 为 0 时一直重试
+    delay = NEO4J_CONNECT_BACKOFF
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await run_in_threadpool(func, *args)
+        except Exception as e:
+            service_state["last_error"] = str(e)
+            if NEO4J_CONNECT_RETRIES and attempt >= NEO4J_CONNECT_RETRIES:
+                raise
+            logging.warning(f"{step_name} failed (attempt {attempt}), retrying in {delay:.1f}s: {str(e)}")
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))  # 加抖动，避免多实例同时重连
+            delay = min(delay * 2, NEO4J_CONNECT_BACKOFF_MAX)
+
+# 用不存在的名字调用热点接口：Neo4j 按查询文本缓存执行计划，参数值不影响，
+# 这样既不用复制一份查询字符串，又保证预热的正是线上执行的那几条
+WARMUP_KEY = "__warmup__"
+
+async def warmup():
+    for statement in INDEX_STATEMENTS:
+        try:
+            await run_in_threadpool(run_query, "warmup_index", statement)
+        except Exception as e:
+            # 只读账号没有建索引的权限；索引由 /bulk_import 负责，这里缺了只影响性能
+            logging.warning(f"Warmup could not create index: {str(e)}")
+    for name, statement in (("warmup_await_indexes", "CALL db.awaitIndexes(300)"),
+                            ("warmup_page_cache", "CALL apoc.warmup.run()")):
+        try:
+            await run_in_threadpool(run_query, name, statement)
+        except Exception as e:
+            logging.info(f"Warmup step {name} skipped: {str(e)}")  # APOC 可能未安装
+
+    calls = [
+        lambda: read_actor(WARMUP_KEY), lambda: read_movie(WARMUP_KEY), lambda: read_director(WARMUP_KEY),
+        lambda: get_actor_filmography(WARMUP_KEY), lambda: get_director_filmography(WARMUP_KEY),
+        lambda: get_movie_cast(WARMUP_KEY), lambda: get_movie_directors(WARMUP_KEY),
+        lambda: get_director_actors(WARMUP_KEY), lambda: get_actor_directors(WARMUP_KEY),
+    ]
+    calls += [lambda t=t: autocomplete(t, WARMUP_KEY) for t in ("actor", "movie")]
+    calls += [lambda t=t: search(t, WARMUP_KEY) for t in ("actor", "movie", "director")]
+    for call in calls:
+        try:
+            await call()
+        except HTTPException:
+            pass  # 404 是预期结果
+        except Exception as e:
+            logging.warning(f"Warmup query failed: {str(e)}")
+
+async def start_services():
+    try:
+        if graph is None:
+            await retry_with_backoff("Neo4j connection", connect_neo4j)
+        service_state["neo4j"] = "up"
+        if WARMUP_ENABLED:
+            started = time.perf_counter()
+            await warmup()
+            service_state["warmup_seconds"] = round(time.perf_counter() - started, 3)
+        await retry_with_backoff("Catalog stats rebuild", ensure_stats_built)
+        service_state["ready"] = True
+        logging.info(f"Service ready (warmup {service_state['warmup_seconds']}s)")
+    except Exception as e:
+        # 重试次数用尽：标记为 failed，存活探测随之失败，由编排系统重启进程
+        service_state["neo4j"] = "failed"
+        service_state["last_error"] = str(e)
+        logging.error(f"Startup failed: {str(e)}")
+        return
+    if ORPHAN_SWEEP_INTERVAL > 0:
+        await run_sweeper()  # 随 startup 任务在关闭时取消
+
+async def stop_services():
+    service_state["ready"] = False
+    slow_queries.executor.shutdown(wait=False)
+    if shared_store.shared:
+        try:
+            await store_call(publish_worker_metrics)  # 退出前发布最后一份，合计里不丢这段时间的计数
+        except Exception as e:
+            logging.warning(f"Publishing final worker metrics failed: {str(e)}")
+    if graph is not None and hasattr(graph, "service"):
+        try:
+            graph.service.connector.close()
+        except Exception as e:
+            logging.warning(f"Error closing Neo4j connections: {str(e)}")
+
 # ==========================================================
 
 @app.get("/health")
 async def health_check():
     try:
         # Test Neo4j connection
-        neo4j_status = graph.run("RETURN 1").evaluate() == 1
+        neo4j_status = graph is not None and run_query("health", "RETURN 1 AS ok")[0]["ok"] == 1
     except Exception:
         neo4j_status = False
 
@@ -761,8 +1894,87 @@ async def health_check():
             "neo4j": "up" if neo4j_status else "down",
             "api": "up"
         }
-    }    
+    }
+
+@app.get("/health/live")
+async def liveness_check():
+    # 进程存活即可，不依赖 Neo4j，避免数据库抖动导致容器被重启；
+    # 只有启动重试次数用尽（NEO4J_CONNECT_RETRIES > 0）后才报告失败
+    if service_state["neo4j"] == "failed":
+        return JSONResponse(status_code=503, content={"status": "startup failed",
+                                                      "last_error": service_state["last_error"]})
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    # 连接、预热都完成且 Neo4j 可达时才接流量
+    ready = service_state["ready"]
+    if ready:
+        try:
+            await run_in_threadpool(run_query, "readiness", "RETURN 1 AS ok")
+        except Exception as e:
+            ready = False
+            service_state["last_error"] = str(e)
+    return JSONResponse(status_code=200 if ready else 503,
+                        content={"status": "ready" if ready else "not ready", **service_state})
+
+@app.get("/metrics")
+async def read_metrics():
+    # Prometheus 文本格式，可直接被 scrape；多 worker 时返回所有 worker 的合计
+    if shared_store.shared:
+        try:
+            body = await run_in_threadpool(render_worker_metrics)
+        except CacheError as e:
+            # 不退回单个 worker 的数值：那样计数器会在两次 scrape 之间回退，不如让这次 scrape 失败
+            return JSONResponse(status_code=503, content={"detail": f"Shared cache unavailable: {str(e)}"})
+    else:
+        body = metrics.render()
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/slow-queries")
+async def read_slow_queries(query: Optional[str] = None, limit: int = Query(50, ge=1, le=SLOW_QUERY_LOG_SIZE)):
+    # 最近的慢查询及其 PROFILE 计划，可按查询名过滤；多 worker 时合并所有 worker 的记录并标出 worker pid
+    if shared_store.shared:
+        try:
+            entries = await run_in_threadpool(worker_slow_queries, query, limit)
+        except CacheError as e:
+            return JSONResponse(status_code=503, content={"detail": f"Shared cache unavailable: {str(e)}"})
+    else:
+        entries = slow_queries.snapshot(query, limit)
+    return {
+        "threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+        "sample_rate": SLOW_QUERY_SAMPLE_RATE,
+        "profile_interval_s": SLOW_QUERY_PROFILE_INTERVAL,
+        "entries": entries,
+    }
+
+def worker_count(value):
+    # "auto" 按 CPU 核数起 worker：读请求大多在等 Neo4j，但序列化和路由是 CPU 密集的
+    return os.cpu_count() or 1 if value == "auto" else int(value)
 
 if __name__ == "__main__":
+    import argparse
+    import tempfile
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8800)
\ No newline at end of file
+    from shared_cache import start_server_process
+
+    parser = argparse.ArgumentParser(description="Movie graph API server")
+    parser.add_argument("--workers", default=os.getenv("WEB_CONCURRENCY", "1"),
+                        help='number of worker processes, or "auto" for one per CPU (default: $WEB_CONCURRENCY or 1)')
+    args = parser.parse_args()
+    workers = worker_count(args.workers)
+
+    if workers == 1:
+        uvicorn.run(app, host="0.0.0.0", port=int(PORT))
+    else:
+        # 已设置 SHARED_CACHE_SOCKET 时使用外部启动的缓存服务，否则自己起一个
+        cache_server = None
+        if not os.getenv("SHARED_CACHE_SOCKET"):
+            socket_path = os.path.join(tempfile.gettempdir(), f"movie-api-cache-{os.getpid()}.sock")
+            cache_server = start_server_process(socket_path)
+            os.environ["SHARED_CACHE_SOCKET"] = socket_path
+        try:
+            uvicorn.run("main:app", host="0.0.0.0", port=int(PORT), workers=workers)
+        finally:
+            if cache_server is not None:
+                cache_server.terminate()
\ No newline at end of file
@@ -0,0 +1,316 @@
+"""Cache shared by all worker processes on one machine.
+
+A single worker uses LocalStore (plain in-process state). With several
+workers, one cache server process owns the state and every worker talks to it
+over a Unix socket through SocketStore. Both execute the same small set of
+operations, and `invalidate` is pushed to every connected worker so they can
+drop their local copies.
+
+Run the server on its own (it is also started by `python main.py --workers N`
+and by gunicorn.conf.py):
+
+    python shared_cache.py --socket /tmp/movie-api-cache.sock
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+MAX_KEYS = int(os.getenv("SHARED_CACHE_MAX_KEYS", 100000))
+# 一条消息一行；asyncio 默认 64KB 的行长上限装不下 /actors 这类整表响应
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+class CacheError(Exception):
+    pass
+
+
+class CacheUnavailable(CacheError):
+    """The cache server could not be reached."""
+
+
+class CacheState:
+    # 键值（可带 TTL）+ 计数哈希；一次 apply 中的多个操作原子执行
+    def __init__(self, max_keys=MAX_KEYS):
+        self.values = {}            # key -> (value, expires_at or None)，统计、游标、租约等状态，不淘汰
+        self.cached = OrderedDict() # set 时带 evictable 的缓存项，按插入顺序，超过 max_keys 淘汰最旧的
+        self.hashes = {}            # key -> {field: number}
+        self.max_keys = max_keys
+        # 每次 invalidate 加一。set 带上结果开始计算时的代数，早于最近一次失效的写入会被拒绝，
+        # 避免写操作之前开始的查询在失效之后把旧结果放回缓存
+        self.generation = 0
+
+    def apply(self, ops):
+        results, invalidated = [], []
+        for op in ops:
+            name = op.get("op")
+            if name == "get":
+                results.append(self._get(op["key"]))
+            elif name == "set":
+                if op.get("generation") is not None and op["generation"] < self.generation:
+                    results.append(False)
+                    continue
+                if op.get("expect") is not None:
+                    # 条件写入：哈希里的某个计数仍是期望值时才写（乐观并发控制）
+                    key, field, expected = op["expect"]
+                    if self.hashes.get(key, {}).get(field, 0) != expected:
+                        results.append(False)
+                        continue
+                self.values.pop(op["key"], None)
+                self.cached.pop(op["key"], None)
+                ttl = op.get("ttl")
+                entry = (op["value"], time.monotonic() + ttl if ttl else None)
+                if op.get("evictable"):
+                    self.cached[op["key"]] = entry
+                    while len(self.cached) > self.max_keys:
+                        self.cached.popitem(last=False)
+                else:
+                    self.values[op["key"]] = entry
+                results.append(True)
+            elif name == "add":
+                # 仅当 key 不存在（或已过期）时写入，用作跨进程租约
+                if self._get(op["key"]) is not None:
+                    results.append(False)
+                    continue
+                ttl = op.get("ttl")
+                self.values[op["key"]] = (op["value"], time.monotonic() + ttl if ttl else None)
+                results.append(True)
+            elif name == "delete":
+                removed = [store.pop(op["key"], None) for store in (self.values, self.cached)]
+                results.append(any(entry is not None for entry in removed))
+            elif name == "invalidate":
+                prefix = op["prefix"]
+                for store in (self.values, self.cached):
+                    for key in [k for k in store if k.startswith(prefix)]:
+                        del store[key]
+                self.generation += 1
+                invalidated.append((prefix, self.generation))
+                results.append(self.generation)
+            elif name == "hincr":
+                # 计数语义：减到 0 及以下的字段直接删除
+                fields = self.hashes.setdefault(op["key"], {})
+                value = fields.get(op["field"], 0) + op["delta"]
+                if value > 0:
+                    fields[op["field"]] = value
+                else:
+                    fields.pop(op["field"], None)
+                results.append(max(value, 0))
+            elif name == "hdel":
+                results.append(self.hashes.get(op["key"], {}).pop(op["field"], None) is not None)
+            elif name == "hreplace":
+                self.hashes[op["key"]] = dict(op["mapping"])
+                results.append(True)
+            elif name == "hgetall":
+                results.append(dict(self.hashes.get(op["key"], {})))
+            elif name == "ping":
+                results.append("pong")
+            else:
+                raise CacheError(f"Unknown cache operation: {name}")
+        return results, invalidated
+
+    def _get(self, key):
+        for store in (self.values, self.cached):
+            entry = store.get(key)
+            if entry is None:
+                continue
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del store[key]
+                return None
+            return value
+        return None
+
+
+class LocalStore:
+    """In-process store for single-worker mode."""
+
+    blocking = False  # 操作只是加锁改字典，可以直接在事件循环里调用
+    shared = False    # 只有本进程能看到
+
+    def __init__(self):
+        self.state = CacheState()
+        self.lock = threading.Lock()
+        self.callbacks = []
+
+    def execute(self, *ops):
+        with self.lock:
+            results, invalidated = self.state.apply(ops)
+        for prefix, generation in invalidated:
+            for callback in self.callbacks:
+                callback(prefix, generation)
+        return results
+
+    def subscribe(self, callback):
+        self.callbacks.append(callback)
+
+
+class SocketStore:
+    """Client for the cache server; each thread gets its own connection."""
+
+    blocking = True  # 每次操作一次 socket 往返，调用方应放到线程池里执行
+    shared = True    # 同一台机器上的所有 worker 共用
+
+    def __init__(self, path, timeout=2.0):
+        self.path = path
+        self.timeout = timeout
+        self.callbacks = []
+        # 每个线程一条连接，慢的操作只占住自己的线程，不会让其他线程排队
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.listener_pid = None  # fork 之后必须重新启动监听线程
+
+    def _open(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock, sock.makefile("rb")
+
+    def _connection(self):
+        pid = os.getpid()
+        if self.listener_pid != pid and self.callbacks:
+            with self.lock:
+                if self.listener_pid != pid:
+                    self.listener_pid = pid
+                    threading.Thread(target=self._listen, name="shared-cache-listener", daemon=True).start()
+        conn = getattr(self.local, "conn", None)
+        if conn is None or conn[0] != pid:  # fork 前建立的连接不能在子进程里用
+            conn = self.local.conn = (pid, *self._open())
+        return conn
+
+    def _close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            _, sock, stream = conn
+            stream.close()
+            sock.close()
+        self.local.conn = None
+
+    def execute(self, *ops):
+        payload = (json.dumps({"ops": list(ops)}, ensure_ascii=False) + "\n").encode("utf-8")
+        for attempt in (1, 2):  # 服务端重启后连接会失效，重连一次
+            try:
+                _, sock, stream = self._connection()
+                sock.sendall(payload)
+                line = stream.readline()
+                if not line:
+                    raise ConnectionError("cache server closed the connection")
+                break
+            except OSError as e:
+                self._close()
+                if attempt == 2:
+                    raise CacheUnavailable(f"{self.path}: {str(e)}") from e
+        reply = json.loads(line)
+        if "error" in reply:
+            raise CacheError(reply["error"])
+        return reply["results"]
+
+    def subscribe(self, callback):
+        self.callbacks.append(callback)
+
+    def _listen(self):
+        while True:
+            try:
+                sock, stream = self._open()
+                sock.settimeout(None)
+                # 服务端先推一条 prefix 为空的通知带上当前代数：断线期间漏掉的失效一并补上
+                sock.sendall(b'{"subscribe": true}\n')
+                for line in stream:
+                    notice = json.loads(line)
+                    for callback in self.callbacks:
+                        callback(notice["invalidate"], notice["generation"])
+            except OSError as e:
+                logging.warning(f"Shared cache subscription lost: {str(e)}")
+            time.sleep(1)
+
+
+def create_store():
+    # 设置了 SHARED_CACHE_SOCKET 就连共享缓存服务，否则用进程内存储
+    path = os.getenv("SHARED_CACHE_SOCKET")
+    return SocketStore(path) if path else LocalStore()
+
+
+# ============================= SERVER =============================
+
+def _notice(prefix, generation):
+    return (json.dumps({"invalidate": prefix, "generation": generation}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def serve(path):
+    state = CacheState()
+    subscribers = set()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("subscribe"):
+                    subscribers.add(writer)
+                    writer.write(_notice("", state.generation))
+                    await writer.drain()
+                    continue
+                try:
+                    results, invalidated = state.apply(message["ops"])
+                    reply = {"results": results}
+                except (CacheError, KeyError, TypeError) as e:
+                    reply, invalidated = {"error": str(e)}, []
+                writer.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+                for prefix, generation in invalidated:
+                    notice = _notice(prefix, generation)
+                    for subscriber in list(subscribers):
+                        subscriber.write(notice)
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            subscribers.discard(writer)
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)  # 上次异常退出留下的 socket 文件
+    server = await asyncio.start_unix_server(handle, path=path, limit=MAX_MESSAGE_BYTES)
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    async with server:
+        await stop.wait()
+
+
+def run_server(path):
+    try:
+        asyncio.run(serve(path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def start_server_process(path, timeout=5.0):
+    """Start the cache server in a child process and wait until it accepts connections."""
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_server, args=(path,), name="shared-cache", daemon=True)
+    process.start()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            SocketStore(path).execute({"op": "ping"})
+            return process
+        except CacheUnavailable:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"Shared cache server did not start on {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared cache server for multi-worker deployments")
+    parser.add_argument("--socket", default=os.getenv("SHARED_CACHE_SOCKET", "/tmp/movie-api-cache.sock"))
+    run_server(parser.parse_args().socket)